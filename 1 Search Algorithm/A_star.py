@@ -1,6 +1,12 @@
 import DR20API
 import numpy as np
-import heapq
+import sys
+import planner
+import grid
+import incremental
+import anyangle
+import hierarchical
+import exploration
 
 ### START CODE HERE ###
 # This code block is optional. You can define your utility function and class in this block if necessary.
@@ -15,12 +21,13 @@ def next_pos(current_map, current_pos):
     Return:
     candidates -- A list of candidates of possible next positions
     """
+    # Only the neighbours are looked at, as the searches use the cached grid.grid_index() of the whole map instead.
+    height, width = np.shape(current_map)
+    x, y = int(current_pos[0]), int(current_pos[1])
     candidates = []
-    directions = np.array([[-1, 0], [1, 0], [0, -1], [0, 1]])
-    for direction in directions:
-        candidate = tuple(np.array(current_pos) + direction)
-        if current_map[candidate] == 0:
-            candidates.append(candidate)
+    for dx, dy in grid.DIRECTIONS[:4].tolist():
+        if 0 <= x + dx < height and 0 <= y + dy < width and current_map[x + dx][y + dy] == 0:
+            candidates.append((x + dx, y + dy))
     return candidates
 
 def distance(current_pos, goal_pos):
@@ -38,7 +45,8 @@ def distance(current_pos, goal_pos):
     return np.linalg.norm(np.array(current_pos) - np.array(goal_pos))
 ###  END CODE HERE  ###
 
-def A_star(current_map, current_pos, goal_pos):
+def A_star(current_map, current_pos, goal_pos, mode='astar', heuristic='euclidean', version=None, time_budget=0.05,
+           stats=None, cache=None):
     """
     Given current map of the world, current position of the robot and the position of the goal, 
     plan a path from current position to the goal using A* algorithm.
@@ -47,31 +55,92 @@ def A_star(current_map, current_pos, goal_pos):
     current_map -- A 120*120 array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
     current_pos -- A 2D vector indicating the current position of the robot.
     goal_pos -- A 2D vector indicating the position of the goal.
+    mode -- The search mode, 'astar' for A* search, 'anytime' for ARA* search within time_budget,
+            'bidirectional' for bidirectional A* search, guided backwards by an estimate of the same kind as heuristic
+            from the start. It does not expand fewer cells than 'astar', see planner.bidirectional_search().
+            'theta' for any-angle search with Lazy Theta*, returning only the vertices of the path (see anyangle.py),
+            'hierarchical' for HPA* search over clusters of the map, kept between calls (see hierarchical.py).
+    heuristic -- 'euclidean' for distance(), 'field' for the exact goal-rooted distance field (see grid.distance_field).
+                 The 'theta' mode always uses distance(), as the field overestimates straight lines.
+    version -- The map version reported by the controller, used to reuse the distance field across replans.
+    time_budget -- The wall-clock time in seconds of the 'anytime' mode.
+    stats -- An optional dict receiving details of the search, 'bound' is the suboptimality bound of the path,
+             'expanded', 'pushes', 'stale' and 'peak_fringe' count the work on the open list (see planner.a_star_search).
+             If it holds a dict under 'phases', the time spent building and evaluating the heuristic, generating
+             the neighbours and searching is added to it (see planner.timed).
+    cache -- An optional planner.PathCache, returning the same path again for the same map, start, goal and options.
 
     Return:
     path -- A N*2 array representing the planned path by A* algorithm.
     """
 
     ### START CODE HERE ###
-    current_pos = tuple(current_pos)
-    goal_pos = tuple(goal_pos)
-
-    fringe, closed = [], {}
-    backward, prev_pos = 0, None
-    while current_pos != goal_pos:
-        if current_pos not in closed:
-            closed[current_pos] = prev_pos
-            candidates = next_pos(current_map, current_pos)
-            for candidate in candidates:
-                priority = backward + 1 + distance(candidate, goal_pos)
-                heapq.heappush(fringe, (priority, candidate, current_pos, backward + 1))
-        _, current_pos, prev_pos, backward = heapq.heappop(fringe)
-    closed[current_pos] = prev_pos
-    
-    path = []
-    while current_pos:
-        path.insert(0, current_pos)
-        current_pos = closed[current_pos]
+    current_map = np.asarray(current_map)
+    if cache is not None:
+        key = ('A_star', grid.map_hash(current_map, version), planner.to_index(current_pos, current_map.shape[1]),
+               planner.to_index(goal_pos, current_map.shape[1]), mode, heuristic, time_budget)
+        return cache.plan(key, lambda details: A_star(current_map, current_pos, goal_pos, mode, heuristic, version,
+                                                      time_budget, details), stats)
+    if mode == 'theta':
+        return planner.timed(stats, 'search', anyangle.theta_star)(current_map, current_pos, goal_pos,
+                                                                   version=version, stats=stats)
+    if mode == 'hierarchical':
+        # Building or repairing the abstract graph computes the costs of its edges.
+        graph = planner.timed(stats, 'cost', hierarchical.hierarchy)(current_map)
+        return planner.timed(stats, 'search', graph.plan)(current_pos, goal_pos, stats)
+    width = current_map.shape[1]
+    start = planner.to_index(current_pos, width)
+    goal = planner.to_index(goal_pos, width)
+
+    index = planner.timed(stats, 'neighbours', grid.grid_index)(current_map, 4, version)
+
+    def expand(current, prev):
+        for _, offset, _ in index.neighbours(current):
+            yield current + offset, 1
+
+    if heuristic == 'field':
+        field = planner.timed(stats, 'heuristic', grid.distance_field)(current_map, goal_pos, 4, version)
+    elif heuristic == 'euclidean':
+        # The same value as distance(), computed for all cells at once.
+        field = planner.timed(stats, 'heuristic', grid.euclidean_field)(current_map.shape, goal_pos)
+    else:
+        raise ValueError("Unknown heuristic: %s" % heuristic)
+    estimate = planner.timed(stats, 'heuristic', field.ravel().tolist().__getitem__)
+    expand = planner.timed(stats, 'neighbours', expand, iterate=True)
+
+    if mode == 'anytime':
+        parent, bound = planner.timed(stats, 'search', planner.anytime_search)(current_map.size, start, goal, expand,
+                                                                               estimate, time_budget, stats=stats)
+    elif mode == 'bidirectional':
+        blocked = current_map.ravel().tolist()
+
+        def predecessors(current, following):
+            # Every neighbour inside the map can move into a traversable cell.
+            if not blocked[current]:
+                for _, offset, _ in index.around(current):
+                    yield current + offset, 1
+
+        # The backward search is guided by an estimate of the same kind as the forward one, as averaging an exact
+        # field with distance() would give away most of it.
+        if heuristic == 'field':
+            reverse_field = planner.timed(stats, 'heuristic', grid.distance_field)(current_map, current_pos, 4, version)
+        else:
+            reverse_field = planner.timed(stats, 'heuristic', grid.euclidean_field)(current_map.shape, current_pos)
+        reverse_estimate = planner.timed(stats, 'heuristic', reverse_field.ravel().tolist().__getitem__)
+        predecessors = planner.timed(stats, 'neighbours', predecessors, iterate=True)
+        parent = planner.timed(stats, 'search', planner.bidirectional_search)(current_map.size, start, goal, expand,
+                                                                              predecessors, estimate,
+                                                                              reverse_estimate, stats)
+        bound = 1.0
+    elif mode == 'astar':
+        parent = planner.timed(stats, 'search', planner.a_star_search)(current_map.size, start, goal, expand,
+                                                                       estimate, stats)
+        bound = 1.0
+    else:
+        raise ValueError("Unknown search mode: %s" % mode)
+    if stats is not None:
+        stats['bound'] = bound
+    path = planner.reconstruct_path(parent, goal, width)
     ###  END CODE HERE  ###
     return path
 
@@ -96,22 +165,68 @@ def reach_goal(current_pos, goal_pos):
 if __name__ == '__main__':
     # Define goal position of the exploration, shown as the gray block in the scene.
     goal_pos = [100, 100]
-    controller = DR20API.Controller()
+    # With --batched, the wheel commands are batched and the pose is read from the streaming buffers.
+    controller = DR20API.Controller(control='batched' if '--batched' in sys.argv else 'blocking')
 
     # Initialize the position of the robot and the map of the world.
     current_pos = controller.get_robot_pos()
     current_map = controller.update_map()
 
+    # With --explore, the unknown scene is mapped first by driving to one frontier after another.
+    if '--explore' in sys.argv:
+        current_pos, current_map = exploration.explore(controller, current_pos, current_map)
+
+    # The goal is fixed, so the search state is kept between iterations and only repaired after map updates.
+    planner_state = incremental.DStarLite(current_map, goal_pos, 4)
+
+    # The cells that changed since the last plan, and the number of plans.
+    path, pending, replans = None, np.zeros(0, dtype=np.int64), 0
+    # The counters of all searches, with phase timings when run with --profile.
+    profile = planner.SearchProfile(phases='--profile' in sys.argv)
+    # With --pipelined, the pose and the scans are streamed by a background thread, so the map is updated
+    # and the search state repaired while the robot moves, instead of after it has stopped.
+    pipelined = '--pipelined' in sys.argv
+    if pipelined:
+        controller.start_telemetry()
+
     # Plan-Move-Perceive-Update-Replan loop until the robot reaches the goal.
     while not reach_goal(current_pos, goal_pos):
-        # Plan a path based on current map from current position of the robot to the goal.
-        path = A_star(current_map, current_pos, goal_pos)
-        # Move the robot along the path to a certain distance.
-        controller.move_robot(path)
+        # The rest of the last path is kept as long as the robot is on it and no new obstacle blocks it.
+        tail = None if path is None else planner.remaining_path(path, current_pos)
+        if tail is None or planner.path_blocked(tail, current_map, pending):
+            # Plan a path based on current map from current position of the robot to the goal.
+            details = profile.stats()
+            path = planner_state.plan(current_pos, current_map, pending, stats=details)
+            profile.add(details)
+            if profile.phases:
+                print("Search %d: %s" % (profile.calls, details))
+            pending = np.zeros(0, dtype=np.int64)
+            replans += 1
+        else:
+            path = tail
+        # Move the robot along the path to a certain distance, steering only towards the waypoints in line of sight.
+        if not pipelined:
+            controller.move_robot(planner.compress_path(path, current_map))
+        else:
+            motion = controller.move_robot_async(planner.compress_path(path, current_map))
+            while motion.is_alive():
+                motion.join(0.05)
+                current_map = controller.update_map()
+                if controller.map_delta.size:
+                    # The cells stay pending, the repaired search is only used once the path is blocked.
+                    pending = np.union1d(pending, controller.map_delta)
+                    planner_state.plan(controller.get_robot_pos(), current_map, controller.map_delta)
         # Get current position of the robot.
         current_pos = controller.get_robot_pos()
         # Update the map based on the current information of laser scanner and get the updated map.
+        # The cells that changed are reported in controller.map_delta.
         current_map = controller.update_map()
+        pending = np.union1d(pending, controller.map_delta)
+    print("Planned %d times" % replans)
+    print(profile.report())
+    print("Control: %(ticks)d steps, %(round_trips)d round trips, %(round_trips_per_tick).2f per step"
+          % controller.get_control_stats())
 
     # Stop the simulation.
+    controller.stop_telemetry()
     controller.stop_simulation()
\ No newline at end of file
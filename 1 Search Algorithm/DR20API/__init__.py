@@ -1,17 +1,65 @@
 import numpy as np
-from math import atan2, sin, cos, pi, tan
+from math import atan2, sin, pi, tan
 import DR20API.sim
+import threading
 import time
 
 class Controller:
-    def __init__(self, port = 19997):
+    # The log-odds added to a cell for a hit and for a beam passing through it, the bound of the log-odds,
+    # and the log-odds above which a cell is occupied in the 'log_odds' mapping mode.
+    LOG_ODDS_HIT = 0.85
+    LOG_ODDS_MISS = -0.4
+    LOG_ODDS_LIMIT = 3.5
+    LOG_ODDS_OCCUPIED = 0.0
+
+    def __init__(self, port = 19997, inflation_radius = 2, mapping = 'binary', control = 'blocking'):
         """
         Initialize the controller of DR20 robot, and connect and start the simulation in CoppeliaSim.
 
         Arguments:
         port -- The port used to connect to coppeliaSim, default 19997.
+        inflation_radius -- The number of cells an obstacle is inflated by in every direction, default 2.
+        mapping -- 'binary' to keep every hit as an obstacle forever, 'log_odds' to keep the log-odds of occupancy
+                   of every cell, raised by hits and lowered by beams passing through, so noisy hits fade out.
+        control -- The control loop of move_robot(), 'blocking' to read the pose of the robot with a blocking call
+                   after every step, 'batched' to send both wheel commands in one message and read the pose
+                   from the streaming buffers, with one round trip per step.
         """
+        if mapping not in ('binary', 'log_odds'):
+            raise ValueError("Unknown mapping mode: %s" % mapping)
+        if control not in ('blocking', 'batched'):
+            raise ValueError("Unknown control mode: %s" % control)
+        self.mapping = mapping
+        self.control = control
+        # The number of control steps of move_robot() and of the calls waiting for a reply of CoppeliaSim,
+        # counted by remote() and updated under sim_lock, see get_control_stats().
+        self.control_ticks = 0
+        self.round_trips = 0
+        self.log_odds = np.zeros((120,120),dtype=np.float32)
+        # The cells hit by the laser scanner, occupied ones in 'log_odds' mode,
+        # and the map of these hits inflated to avoid collision.
+        self.hit_map = np.zeros((120,120),dtype=bool)
         self.current_map = np.zeros((120,120),dtype="uint8")
+        # The version increases whenever the map changes, map_delta holds the flattened ids (x * 120 + y)
+        # of the cells changed by the last update, and map_region the part of the map containing them.
+        self.map_version = 0
+        self.map_delta = np.zeros(0, dtype=np.int64)
+        self.map_region = None
+        # The cells observed by the laser scanner so far, the rest of the map is only assumed to be free.
+        self.known_map = np.zeros((120,120),dtype=bool)
+        # The angles of the 684 beams relative to the laser scanner.
+        AtoR = 1.0 / 180.0 * pi
+        self.beam_angles = AtoR * (np.arange(684) * 240 / (684 - 1) + (-120))
+        self.inflation_radius = inflation_radius
+        self.inflation = self.structuring_element(inflation_radius)
+        # The background thread of start_telemetry(), its latest snapshot, and the scan last used by update_map.
+        # The lock serializes the calls to the remote API of the threads.
+        self.sim_lock = threading.RLock()
+        self.telemetry_thread = None
+        self.telemetry_stop = threading.Event()
+        self.telemetry_ready = threading.Condition()
+        self.telemetry = None
+        self.scan_tick = -1
         self.port = port
         self.client = self.connect_simulation(self.port)
         # Get handles
@@ -78,47 +126,331 @@ class Controller:
         time.sleep(0.5)
         print("Stop the simulation.")
 
+    def remote(self, function, *args):
+        """
+        Call a function of the remote API, counting it as a round trip if it waits for a reply of CoppeliaSim,
+        which are the blocking calls and the trigger of a simulation step.
+
+        Arguments:
+        function -- The function of the remote API.
+        args -- The arguments of the function, the operation mode last if it takes one.
+
+        Return:
+        result -- The return value of the function.
+        """
+        if function is sim.simxSynchronousTrigger or args[-1] == sim.simx_opmode_blocking:
+            self.round_trips += 1
+        return function(*args)
+
+    def start_telemetry(self, period = 0.01):
+        """
+        Start a background thread reading the pose of the robot and the laser scanner from the streaming buffers,
+        which only read what CoppeliaSim has already sent, so they never wait for the simulator.
+        Until stop_telemetry() is called, update_map(), get_robot_pos() and get_robot_ori() use the latest snapshot
+        instead of blocking calls, and planning can overlap with the motion of move_robot_async().
+
+        Arguments:
+        period -- The time in seconds between two reads of the buffers.
+        """
+        if self.telemetry_thread is not None:
+            return
+        self.telemetry_stop.clear()
+        self.telemetry_thread = threading.Thread(target=self.stream_telemetry, args=(period,), daemon=True)
+        self.telemetry_thread.start()
+        with self.telemetry_ready:
+            self.telemetry_ready.wait_for(lambda: self.telemetry is not None)
+
+    def stream_telemetry(self, period):
+        """
+        Publish snapshots of the streams until stop_telemetry() is called, run by the thread of start_telemetry().
+
+        Arguments:
+        period -- The time in seconds between two reads of the buffers.
+        """
+        tick, raw = 0, None
+        while not self.telemetry_stop.is_set():
+            with self.sim_lock:
+                _, pos = self.remote(sim.simxGetObjectPosition, self.client, self.robot, -1, sim.simx_opmode_buffer)
+                _, orientation = self.remote(sim.simxGetObjectOrientation, self.client, self.robot, -1,
+                                             sim.simx_opmode_buffer)
+                _, sensor_pos = self.remote(sim.simxGetObjectPosition, self.client, self.sensor, -1,
+                                            sim.simx_opmode_buffer)
+                _, sensor_orientation = self.remote(sim.simxGetObjectOrientation, self.client, self.sensor, -1,
+                                                    sim.simx_opmode_buffer)
+                code, data = self.remote(sim.simxGetStringSignal, self.client, 'UG01_distance', sim.simx_opmode_buffer)
+            previous = self.telemetry
+            # The buffer keeps the last scan received, so a scan only counts as new when its data changed,
+            # and update_map() does not use a scan twice.
+            if previous is None or (code == sim.simx_return_ok and data != raw):
+                tick += 1
+                raw, scan = data, sim.simxUnpackFloats(data)
+            else:
+                scan = previous['scan']
+            # The snapshot is replaced as a whole, so a reader always sees a consistent one.
+            with self.telemetry_ready:
+                self.telemetry = {'robot_pos': pos, 'robot_ori': orientation, 'sensor_pos': sensor_pos,
+                                  'sensor_ori': sensor_orientation, 'scan': scan, 'tick': tick,
+                                  'time': time.perf_counter()}
+                self.telemetry_ready.notify_all()
+            self.telemetry_stop.wait(period)
+
+    def stop_telemetry(self):
+        """
+        Stop the thread of start_telemetry(), the controller uses blocking calls again.
+        """
+        if self.telemetry_thread is None:
+            return
+        self.telemetry_stop.set()
+        self.telemetry_thread.join()
+        self.telemetry_thread = None
+        self.telemetry = None
+
+    def get_snapshot(self):
+        """
+        Get the latest snapshot published by the thread of start_telemetry().
+
+        Return:
+        snapshot -- A dict of the position 'robot_pos' and orientation 'robot_ori' of the robot, the position
+                    'sensor_pos' and orientation 'sensor_ori' of the laser scanner, the unpacked 'scan',
+                    the number 'tick' of scans received and the 'time' of the snapshot, None if the thread is not running.
+        """
+        return self.telemetry
+
+    def move_robot_async(self, path):
+        """
+        Start move_robot() in a background thread, so the caller can plan while the robot moves.
+
+        Arguments:
+        path -- A N*2 array indicating the planned path, see move_robot().
+
+        Return:
+        motion -- The started threading.Thread, alive until the robot has finished the motion.
+        """
+        motion = threading.Thread(target=self.move_robot, args=(path,), daemon=True)
+        motion.start()
+        return motion
+
     def update_map(self):
         """
         Update the map based on the current information of laser scanner. The obstacles are inflated to avoid collision.
+        New hits are added to hit_map, and only they are inflated into the map.
+        In 'log_odds' mode, hit_map holds the cells whose log-odds exceed LOG_ODDS_OCCUPIED (see update_log_odds()).
+        The changed cells, the region containing them and the map version are recorded, see get_map_delta(),
+        and the cells crossed by the beams are marked in known_map.
+        With start_telemetry(), the latest snapshot is used without waiting for the simulator,
+        and the map is left as it is if the scan has already been used.
 
         Return:
         current_map -- A 120*120 array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
         """
-        _, pos = sim.simxGetObjectPosition(self.client, self.sensor, -1, sim.simx_opmode_blocking)
-        _, orientation = sim.simxGetObjectOrientation(self.client, self.sensor, -1, sim.simx_opmode_buffer)
-        _, data = sim.simxGetStringSignal(self.client, 'UG01_distance', sim.simx_opmode_buffer)
-        sim.simxSynchronousTrigger(self.client)
-        data = sim.simxUnpackFloats(data)
+        snapshot = self.telemetry
+        if snapshot is not None:
+            if snapshot['tick'] == self.scan_tick:
+                self.record_change(np.zeros(0, dtype=np.int64))
+                return self.current_map
+            self.scan_tick = snapshot['tick']
+            pos, orientation, data = snapshot['sensor_pos'], snapshot['sensor_ori'], snapshot['scan']
+        else:
+            with self.sim_lock:
+                _, pos = self.remote(sim.simxGetObjectPosition, self.client, self.sensor, -1, sim.simx_opmode_blocking)
+                _, orientation = self.remote(sim.simxGetObjectOrientation, self.client, self.sensor, -1,
+                                             sim.simx_opmode_buffer)
+                _, data = self.remote(sim.simxGetStringSignal, self.client, 'UG01_distance', sim.simx_opmode_buffer)
+                self.remote(sim.simxSynchronousTrigger, self.client)
+            data = sim.simxUnpackFloats(data)
 
         scale = 10.
-        AtoR = 1.0 / 180.0 * pi
-        pixel_x, pixel_y = 0, 0
-        for i in range(1,685):
-            absolute_angle = AtoR * ((i - 1) * 240 / (684 - 1) + (-120)) + orientation[2]
-            lidar_pose_x = pos[0]
-            lidar_pose_y = pos[1]
-            if abs(data[i*3 -2]) > 1:
-                obstacle_x = lidar_pose_x + data[i*3 - 2] * cos(absolute_angle - 0 * AtoR)
-                obstacle_y = lidar_pose_y + data[i*3 - 2] * cos(absolute_angle - 90 * AtoR)
-                pixel_x=round(obstacle_x*scale)
-                pixel_y=round(obstacle_y*scale)
-
-            if pixel_x > 3 and pixel_x <= 117 and pixel_y > 3 and pixel_y <= 116:
-                for i in range(-2,3):
-                    for j in range(-2,3):
-                        self.current_map[pixel_x + i][pixel_y + j] = 1
-
+        # The distance measured by every beam, all beams are projected at once.
+        ranges = np.array(data[1:684 * 3:3], dtype=float)
+        absolute_angle = self.beam_angles + orientation[2]
+        self.mark_known(pos, absolute_angle, np.abs(ranges), scale)
+        hit = np.abs(ranges) > 1
+        obstacle_x = pos[0] + ranges[hit] * np.cos(absolute_angle[hit])
+        obstacle_y = pos[1] + ranges[hit] * np.sin(absolute_angle[hit])
+        pixel_x = np.rint(obstacle_x * scale).astype(np.int64)
+        pixel_y = np.rint(obstacle_y * scale).astype(np.int64)
+        inside = (pixel_x > 3) & (pixel_x <= 117) & (pixel_y > 3) & (pixel_y <= 116)
+
+        if self.mapping == 'log_odds':
+            self.update_log_odds(np.rint(np.array(pos[:2]) * scale).astype(np.int64), pixel_x, pixel_y, inside)
+            return self.current_map
+
+        # Only the cells hit for the first time are inflated, the earlier ones are already in the map.
+        hits = np.unique(pixel_x[inside] * self.current_map.shape[1] + pixel_y[inside])
+        hits = hits[~self.hit_map.flat[hits]]
+        self.hit_map.flat[hits] = True
+        inflated = self.inflate(hits)
+        delta = np.flatnonzero(inflated & (self.current_map.ravel() == 0))
+        self.current_map.flat[delta] = 1
+
+        self.record_change(delta)
         current_map = self.current_map
         return current_map
 
+    def update_log_odds(self, origin, pixel_x, pixel_y, inside):
+        """
+        Update the log-odds grid with a scan, tracing all beams at once, and the map with the thresholded grid.
+        Every cell is updated at most once per scan, so the cost of an update is bounded by the number of beams
+        times their length in cells.
+
+        Arguments:
+        origin -- The cell of the laser scanner.
+        pixel_x -- The rows of the cells hit by the beams.
+        pixel_y -- The columns of the cells hit by the beams.
+        inside -- A bool array of the hits within the bounds of the map, the other beams only clear cells.
+        """
+        height, width = self.current_map.shape
+        # A DDA traversal of every beam, one cell per step along the major axis, without the hit cell.
+        dx, dy = pixel_x - origin[0], pixel_y - origin[1]
+        steps = np.maximum(np.abs(dx), np.abs(dy))
+        k = np.arange(steps.max() if steps.size else 0, dtype=np.float32)[:, None]
+        x = np.rint(origin[0] + k * (dx / np.maximum(steps, 1)).astype(np.float32)).astype(np.int32)
+        y = np.rint(origin[1] + k * (dy / np.maximum(steps, 1)).astype(np.float32)).astype(np.int32)
+        crossed = (k < steps) & (x >= 0) & (x < height) & (y >= 0) & (y < width)
+
+        hits = np.zeros(self.log_odds.size, dtype=bool)
+        hits[pixel_x[inside] * width + pixel_y[inside]] = True
+        misses = np.zeros(self.log_odds.size, dtype=bool)
+        misses[x[crossed] * width + y[crossed]] = True
+        misses &= ~hits
+        log_odds = self.log_odds.ravel()
+        log_odds[hits] += self.LOG_ODDS_HIT
+        log_odds[misses] += self.LOG_ODDS_MISS
+        np.clip(log_odds, -self.LOG_ODDS_LIMIT, self.LOG_ODDS_LIMIT, out=log_odds)
+
+        occupied = self.occupancy_view(inflate=False).ravel() != 0
+        freed = np.flatnonzero(self.hit_map.ravel() & ~occupied)
+        added = np.flatnonzero(occupied & ~self.hit_map.ravel())
+        self.hit_map.flat[freed] = False
+        self.hit_map.flat[added] = True
+        if len(freed) > 0:
+            # A freed cell may still be covered by the inflation of another hit, so the inflation is redone.
+            inflated = self.inflate(np.flatnonzero(self.hit_map))
+        else:
+            inflated = (self.current_map.ravel() != 0) | self.inflate(added)
+        delta = np.flatnonzero(inflated != (self.current_map.ravel() != 0))
+        self.current_map.flat[delta] = inflated[delta]
+        self.record_change(delta)
+
+    def occupancy_view(self, threshold=None, inflate=True):
+        """
+        Get a thresholded view of the log-odds grid of the 'log_odds' mapping mode.
+
+        Arguments:
+        threshold -- The log-odds above which a cell is an obstacle, LOG_ODDS_OCCUPIED if None.
+        inflate -- Whether the obstacles are inflated by inflation_radius.
+
+        Return:
+        current_map -- A 120*120 array, where 0 indicating traversable and 1 indicating obstacles.
+        """
+        threshold = self.LOG_ODDS_OCCUPIED if threshold is None else threshold
+        occupied = self.log_odds > threshold
+        if inflate:
+            occupied = self.inflate(np.flatnonzero(occupied)).reshape(occupied.shape)
+        return occupied.astype(np.uint8)
+
+    def structuring_element(self, radius):
+        """
+        Get the offsets of the cells an obstacle is inflated to.
+
+        Arguments:
+        radius -- The number of cells an obstacle is inflated by in every direction.
+
+        Return:
+        offsets -- A K*2 int array of the offsets of the (2 * radius + 1)^2 cells of the square around an obstacle.
+        """
+        return np.argwhere(np.ones((2 * radius + 1, 2 * radius + 1), dtype=bool)) - radius
+
+    def inflate(self, hits):
+        """
+        Inflate obstacle cells with the structuring element, all cells at once.
+
+        Arguments:
+        hits -- An array of flattened ids of the obstacle cells.
+
+        Return:
+        inflated -- A flattened bool array of the cells covered by the inflated obstacles.
+        """
+        height, width = self.current_map.shape
+        x = np.asarray(hits)[:, None] // width + self.inflation[:, 0]
+        y = np.asarray(hits)[:, None] % width + self.inflation[:, 1]
+        inside = (x >= 0) & (x < height) & (y >= 0) & (y < width)
+        inflated = np.zeros(self.current_map.size, dtype=bool)
+        inflated[x[inside] * width + y[inside]] = True
+        return inflated
+
+    def set_inflation_radius(self, radius):
+        """
+        Change the inflation of the obstacles, re-deriving the map from hit_map without scanning again.
+        The changed cells, the region containing them and the map version are recorded, see get_map_delta().
+
+        Arguments:
+        radius -- The number of cells an obstacle is inflated by in every direction.
+
+        Return:
+        map_region -- A tuple of slices (rows, columns) of the part of the map that changed, None if nothing changed.
+        """
+        self.inflation_radius = radius
+        self.inflation = self.structuring_element(radius)
+        inflated = self.inflate(np.flatnonzero(self.hit_map))
+        delta = np.flatnonzero(inflated != (self.current_map.ravel() != 0))
+        self.current_map.flat[delta] = inflated[delta]
+        self.record_change(delta)
+        return self.map_region
+
+    def record_change(self, delta):
+        """
+        Record the cells changed by an update of the map, see get_map_delta().
+
+        Arguments:
+        delta -- An array of flattened ids of the changed cells.
+        """
+        self.map_delta = delta
+        self.map_region = None
+        if len(delta) > 0:
+            self.map_version += 1
+            x, y = np.divmod(delta, self.current_map.shape[1])
+            self.map_region = (slice(int(x.min()), int(x.max()) + 1), slice(int(y.min()), int(y.max()) + 1))
+
+    def mark_known(self, pos, angles, ranges, scale):
+        """
+        Mark the cells crossed by the beams of the laser scanner as observed, all beams at once.
+
+        Arguments:
+        pos -- The position of the laser scanner in meters.
+        angles -- The absolute angles of the beams in radian.
+        ranges -- The measured distance of the beams in meters.
+        scale -- The number of cells per meter.
+        """
+        # Every beam is sampled about once per cell up to the measured distance.
+        fractions = np.linspace(0, 1, int(ranges.max() * scale) + 2, dtype=np.float32)[:, None]
+        height, width = self.known_map.shape
+        x = np.rint(pos[0] * scale + fractions * (ranges * np.cos(angles) * scale).astype(np.float32)).astype(np.int32)
+        y = np.rint(pos[1] * scale + fractions * (ranges * np.sin(angles) * scale).astype(np.float32)).astype(np.int32)
+        inside = (x >= 0) & (x < height) & (y >= 0) & (y < width)
+        self.known_map.flat[x[inside] * width + y[inside]] = True
+
+    def get_map_delta(self):
+        """
+        Get the change of the map made by the last call of update_map or set_inflation_radius.
+
+        Return:
+        map_version -- An integer increased by one every time the map changes.
+        map_delta -- An array of flattened ids (x * 120 + y) of the changed cells. They became occupied in update_map
+                     in 'binary' mode, and became occupied or free in 'log_odds' mode and in set_inflation_radius,
+                     so the map has to be looked up to tell them apart.
+        map_region -- A tuple of slices (rows, columns) of the part of the map containing the changed cells,
+                      None if nothing changed.
+        """
+        return self.map_version, self.map_delta, self.map_region
+
     def move_robot(self, path):
         """
         Given planned path of the robot,
         control the robot track a part of path, with a maximum of 3 meters from the start position.
 
         Arguments:
-        path -- A N*2 array indicating the planned path.
+        path -- A N*2 array indicating the planned path, either every cell or only the waypoints (see planner.compress_path).
         """
         k1 = 1.5
         k2 = 0
@@ -128,15 +460,26 @@ class Controller:
         path = np.array(path)/10
         for i in range(1,len(path)):
             if np.linalg.norm(path[i] - path[0]) >= 3 and np.linalg.norm(path[i-1] - path[0]) <= 3:
-                path = path[0:i]
+                # Waypoints can be far apart, so the path ends where the segment leaves the 3 meters range.
+                step = path[i] - path[i-1]
+                offset = path[i-1] - path[0]
+                a, b, c = step.dot(step), 2 * step.dot(offset), offset.dot(offset) - 9
+                t = (-b + np.sqrt(b * b - 4 * a * c)) / (2 * a)
+                path = np.vstack([path[0:i], path[i-1] + t * step])
                 break
 
         final_target = np.array(path[-1])
 
-        _, pos = sim.simxGetObjectPosition(self.client, self.robot, -1, sim.simx_opmode_blocking)
-        pos = pos[0:-1]
+        # In 'batched' mode, the pose comes from the streaming buffers started in __init__(), which already hold
+        # the pose after the last step, and only the trigger of a step waits for CoppeliaSim.
+        batched = self.control == 'batched'
+        read_mode = sim.simx_opmode_buffer if batched else sim.simx_opmode_blocking
+        with self.sim_lock:
+            _, pos = self.remote(sim.simxGetObjectPosition, self.client, self.robot, -1, read_mode)
+            pos = pos[0:-1]
 
-        _, orientation = sim.simxGetObjectOrientation(self.client, self.robot, -1, sim.simx_opmode_buffer)
+            _, orientation = self.remote(sim.simxGetObjectOrientation, self.client, self.robot, -1,
+                                         sim.simx_opmode_buffer)
 
         for i in range(1,len(path)):
             target = path[i]
@@ -162,16 +505,36 @@ class Controller:
                     v_r = u
                     v_l = -u
 
-                sim.simxSetJointTargetVelocity(self.client, self.handle_left_wheel[1], v_l,
-                                               sim.simx_opmode_streaming)
-                sim.simxSetJointTargetVelocity(self.client, self.handle_right_wheel[1], v_r,
-                                               sim.simx_opmode_streaming)
-                sim.simxSynchronousTrigger(self.client)
+                with self.sim_lock:
+                    # Paused, the two commands are queued and sent together once the communication is resumed.
+                    if batched:
+                        self.remote(sim.simxPauseCommunication, self.client, 1)
+                    self.remote(sim.simxSetJointTargetVelocity, self.client, self.handle_left_wheel[1], v_l,
+                                sim.simx_opmode_streaming)
+                    self.remote(sim.simxSetJointTargetVelocity, self.client, self.handle_right_wheel[1], v_r,
+                                sim.simx_opmode_streaming)
+                    if batched:
+                        self.remote(sim.simxPauseCommunication, self.client, 0)
+                    self.remote(sim.simxSynchronousTrigger, self.client)
+
+                    _, pos = self.remote(sim.simxGetObjectPosition, self.client, self.robot, -1, read_mode)
+                    pos = pos[0:-1]
+                    self.robot_pos = pos
+                    _, orientation = self.remote(sim.simxGetObjectOrientation, self.client, self.robot, -1,
+                                                 sim.simx_opmode_buffer)
+                self.control_ticks += 1
+
+    def get_control_stats(self):
+        """
+        Get the cost of the control loop so far, as counted by remote().
 
-                _, pos = sim.simxGetObjectPosition(self.client, self.robot, -1, sim.simx_opmode_blocking)
-                pos = pos[0:-1]
-                self.robot_pos = pos
-                _, orientation = sim.simxGetObjectOrientation(self.client, self.robot, -1, sim.simx_opmode_buffer)
+        Return:
+        stats -- A dict of the number of control steps 'ticks' of move_robot(), the number of 'round_trips'
+                 to CoppeliaSim made since the controller was initialized, including the ones of update_map()
+                 and get_robot_pos() between the motions, and the 'round_trips_per_tick'.
+        """
+        return {'ticks': self.control_ticks, 'round_trips': self.round_trips,
+                'round_trips_per_tick': self.round_trips / max(self.control_ticks, 1)}
 
     def get_robot_pos(self):
         """
@@ -180,7 +543,12 @@ class Controller:
         Return:
         robot_pos -- A 2D vector indicating the coordinate of robot's current position in the grid map.
         """
-        _, pos = sim.simxGetObjectPosition(self.client, self.robot, -1, sim.simx_opmode_blocking)
+        snapshot = self.telemetry
+        if snapshot is not None:
+            pos = snapshot['robot_pos']
+        else:
+            with self.sim_lock:
+                _, pos = self.remote(sim.simxGetObjectPosition, self.client, self.robot, -1, sim.simx_opmode_blocking)
         self.robot_pos = pos[0:-1]
         robot_pos = np.array(self.robot_pos)
         robot_pos = (robot_pos * 10).astype(np.int16)
@@ -193,7 +561,13 @@ class Controller:
         Return:
         robot_ori -- A float number indicating current orientation of the robot in radian.
         """
-        _, orientation = sim.simxGetObjectOrientation(self.client, self.robot, -1, sim.simx_opmode_buffer)
+        snapshot = self.telemetry
+        if snapshot is not None:
+            orientation = snapshot['robot_ori']
+        else:
+            with self.sim_lock:
+                _, orientation = self.remote(sim.simxGetObjectOrientation, self.client, self.robot, -1,
+                                             sim.simx_opmode_buffer)
         self.robot_ori = orientation[2]
         robot_ori = self.robot_ori
         return robot_ori
\ No newline at end of file
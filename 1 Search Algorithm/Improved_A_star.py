@@ -1,6 +1,12 @@
 import DR20API
 import numpy as np
-import heapq
+import sys
+import planner
+import grid
+import jps
+import lattice
+import anyangle
+import exploration
 
 ### START CODE HERE ###
 # This code block is optional. You can define your utility function and class in this block if necessary.
@@ -15,12 +21,13 @@ def next_pos(current_map, current_pos):
     Return:
     candidates -- A list of candidates of possible next positions
     """
+    # Only the neighbours are looked at, as the searches use the cached grid.grid_index() of the whole map instead.
+    height, width = np.shape(current_map)
+    x, y = int(current_pos[0]), int(current_pos[1])
     candidates = []
-    directions = np.array([[-1, 0], [1, 0], [0, -1], [0, 1], [-1, -1], [-1, 1], [1, -1], [1, 1]])
-    for direction in directions:
-        candidate = tuple(np.array(current_pos) + direction)
-        if current_map[candidate] == 0:
-            candidates.append(candidate)
+    for dx, dy in grid.DIRECTIONS[:8].tolist():
+        if 0 <= x + dx < height and 0 <= y + dy < width and current_map[x + dx][y + dy] == 0:
+            candidates.append((x + dx, y + dy))
     return candidates
 
 def distance(current_pos, goal_pos):
@@ -37,7 +44,9 @@ def distance(current_pos, goal_pos):
     """
     return np.linalg.norm(np.array(current_pos) - np.array(goal_pos))
 
-def cost(current_map, current_pos, candidate, prev_pos):
+DISTANCE_FACTOR, OBSTACLES_FACTOR, STEERING_FACTOR = 1, 1, 1
+
+def cost(current_map, current_pos, candidate, prev_pos, penalty=None, current_ori=None):
     """
     Calculate the cost to move from current position to goal position
 
@@ -46,6 +55,10 @@ def cost(current_map, current_pos, candidate, prev_pos):
     current_pos -- A 2D vector indicating the current position of the robot.
     candidate -- A 2D vector indicating the candidate of the next position of the robot.
     prev_pos -- A 2D vector indicating the previous position of the robot, None if the robot is in its initial position.
+    penalty -- The obstacle cost layer returned by obstacle_penalty(), otherwise the neighbouring obstacles
+               of the candidate are counted.
+    current_ori -- The orientation of the robot in radian at its initial position, queried from the controller
+                   for the first move if not given.
 
     Return:
     cost -- An integer representing the cost to move from current position to goal position with the following rules:
@@ -54,19 +67,80 @@ def cost(current_map, current_pos, candidate, prev_pos):
     * Additional cost for steering: 1 for each $\pi / 4$ turned
       Note that the default direction for the robot is (1, 0)
     """
-    current_ori = controller.get_robot_ori()
-    prev_path = np.array(current_pos) - np.array(prev_pos) if prev_pos else np.array([np.sin(current_ori), np.cos(current_ori)])
+    if prev_pos is not None:
+        prev_path = np.array(current_pos) - np.array(prev_pos)
+    else:
+        if current_ori is None:
+            current_ori = controller.get_robot_ori()
+        prev_path = np.array([np.sin(current_ori), np.cos(current_ori)])
     next_path = np.array(candidate) - np.array(current_pos)
 
     distance = np.linalg.norm(next_path)
-    obstacles = (8 - len(next_pos(current_map, candidate))) / 4
+    if penalty is None:
+        # Cells outside the map count as obstacles, the same as in obstacle_penalty().
+        obstacles = (8 - len(next_pos(current_map, candidate))) / 4
+    else:
+        obstacles = penalty[tuple(candidate)]
     steering = 1 - prev_path.dot(next_path) / (np.linalg.norm(prev_path) * np.linalg.norm(next_path))
 
-    distance_factor, obstacles_factor, steering_factor = 1, 1, 1
-    return distance * distance_factor + obstacles * obstacles_factor + steering * steering_factor
+    return distance * DISTANCE_FACTOR + obstacles * OBSTACLES_FACTOR + steering * STEERING_FACTOR
+
+def steering_table(current_ori):
+    """
+    Precompute the steering cost of cost() between every pair of moving directions.
+
+    Arguments:
+    current_ori -- The orientation of the robot in radian at its initial position.
+
+    Return:
+    table -- A 9*8 array, where table[i][j] is the steering cost of moving in grid.DIRECTIONS[j] after moving in
+             grid.DIRECTIONS[i], and the last row is for the first move from the initial orientation.
+    """
+    headings = np.vstack([grid.DIRECTIONS, [np.sin(current_ori), np.cos(current_ori)]])
+    headings = headings / np.linalg.norm(headings, axis=1, keepdims=True)
+    directions = grid.DIRECTIONS / np.linalg.norm(grid.DIRECTIONS, axis=1, keepdims=True)
+    return (1 - headings @ directions.T) * STEERING_FACTOR
+
+def obstacle_penalty(current_map, radius=None, version=None):
+    """
+    Calculate the additional cost for moving beside obstacles of every cell at once.
+    The underlying layer is computed once per map version, so cost() only looks it up.
+
+    Arguments:
+    current_map -- A 120*120 array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+    radius -- If None, 1/4 for each neighboring obstacle of the cell. Otherwise a graded penalty
+              (radius + 1 - d) / radius for cells within distance d <= radius of the nearest obstacle.
+    version -- The map version reported by the controller, or None to compare the map content.
+
+    Return:
+    penalty -- A 120*120 array of the additional cost for moving into each cell.
+    """
+    if radius is None:
+        return grid.obstacle_count(current_map, version) / 4
+    distance = grid.obstacle_distance(current_map, radius, version)
+    return np.maximum(radius + 1 - distance.astype(float), 0) / radius
 ###  END CODE HERE  ###
 
-def Improved_A_star(current_map, current_pos, goal_pos):
+def reverse_penalized_field(current_map, current_pos, penalty):
+    """
+    Compute the cost of the shortest path from the current position to every cell, paying the penalty of every
+    entered cell, as the estimate of the backward search of the 'bidirectional' mode.
+
+    Arguments:
+    current_map -- A 120*120 array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+    current_pos -- A 2D vector indicating the current position of the robot.
+    penalty -- A H*W array of additional cost for entering each cell.
+
+    Return:
+    field -- A H*W array of path costs from the current position, without the steering cost.
+    """
+    # The moves are symmetric, so the paths to the current position cross the same cells in the other direction,
+    # entering the current position instead of the cell they start from.
+    field = grid.compute_distance_field(current_map, current_pos, 8, penalty)
+    return field + penalty - penalty[int(current_pos[0]), int(current_pos[1])]
+
+def Improved_A_star(current_map, current_pos, goal_pos, mode='lattice', max_jump=None, radius=None, version=None,
+                    current_ori=None, heuristic='field', time_budget=0.05, stats=None, cache=None):
     """
     Given current map of the world, current position of the robot and the position of the goal, 
     plan a path from current position to the goal using improved A* algorithm.
@@ -75,32 +149,125 @@ def Improved_A_star(current_map, current_pos, goal_pos):
     current_map -- A 120*120 array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
     current_pos -- A 2D vector indicating the current position of the robot.
     goal_pos -- A 2D vector indicating the position of the goal.
+    mode -- The search mode, 'lattice' for A* search over (x, y, heading) states (see lattice.py),
+            'astar' for A* search over positions, where the first heading to reach a cell wins,
+            'jps' for Jump Point Search with bounded jumps, 'anytime' for ARA* search over the lattice within time_budget,
+            'bidirectional' for bidirectional A* search over the lattice, guided backwards by an estimate of the same kind
+            as heuristic from the start. It expands about as many states as 'lattice' and is slower, see
+            planner.bidirectional_search().
+            'theta' for any-angle search with Theta*, returning only the vertices of the path (see anyangle.py).
+            Straight lines pay the obstacle penalty of every crossed cell, and the steering cost is not considered.
+    max_jump -- The maximum number of cells of a single jump in 'jps' mode, unbounded if None.
+    radius -- The radius of the graded obstacle penalty, or None for the neighbouring obstacle count (see obstacle_penalty()).
+    version -- The map version reported by the controller, used to reuse the obstacle cost layer.
+    current_ori -- The orientation of the robot in radian, queried once from the controller if not given.
+    heuristic -- 'euclidean' for distance(), 'field' for the goal-rooted distance field including the obstacle penalty,
+                 which only underestimates the steering cost (see grid.compute_distance_field).
+                 The 'theta' mode always uses distance(), as the field overestimates straight lines.
+    time_budget -- The wall-clock time in seconds of the 'anytime' mode.
+    stats -- An optional dict receiving details of the search, 'bound' is the suboptimality bound of the path,
+             'expanded', 'pushes', 'stale' and 'peak_fringe' count the work on the open list (see planner.a_star_search).
+             If it holds a dict under 'phases', the time spent building the cost layers, building and evaluating
+             the heuristic, generating the neighbours with their edge costs and searching is added to it
+             (see planner.timed).
+    cache -- An optional planner.PathCache, returning the same path again for the same map, start, goal, orientation
+             and options.
 
     Return:
     path -- A N*2 array representing the planned path by improved A* algorithm.
     """
 
     ### START CODE HERE ###
-    current_pos = tuple(current_pos)
-    goal_pos = tuple(goal_pos)
-
-    fringe, closed = [], {}
-    backward, prev_pos = 0, None
-    while current_pos != goal_pos:
-        if current_pos not in closed:
-            closed[current_pos] = prev_pos
-            candidates = next_pos(current_map, current_pos)
-            for candidate in candidates:
-                weight = cost(current_map, current_pos, candidate, prev_pos)
-                priority = backward + weight + distance(candidate, goal_pos)
-                heapq.heappush(fringe, (priority, candidate, current_pos, backward + weight))
-        _, current_pos, prev_pos, backward = heapq.heappop(fringe)
-    closed[current_pos] = prev_pos
-    
-    path = []
-    while current_pos:
-        path.insert(0, current_pos)
-        current_pos = closed[current_pos]
+    current_map = np.asarray(current_map)
+    if cache is not None:
+        if current_ori is None:
+            current_ori = controller.get_robot_ori()
+        key = ('Improved_A_star', grid.map_hash(current_map, version), planner.to_index(current_pos, current_map.shape[1]),
+               planner.to_index(goal_pos, current_map.shape[1]), round(float(current_ori), 6),
+               mode, max_jump, radius, heuristic, time_budget)
+        return cache.plan(key, lambda details: Improved_A_star(current_map, current_pos, goal_pos, mode, max_jump, radius,
+                                                               version, current_ori, heuristic, time_budget, details), stats)
+    penalty = planner.timed(stats, 'cost', obstacle_penalty)(current_map, radius, version) * OBSTACLES_FACTOR
+    if mode == 'theta':
+        return planner.timed(stats, 'search', anyangle.theta_star)(current_map, current_pos, goal_pos, penalty,
+                                                                   version=version, stats=stats)
+    # The orientation is only needed for the first move, so the steering costs are looked up from a table
+    # instead of querying the simulator for every edge.
+    if current_ori is None:
+        current_ori = controller.get_robot_ori()
+    steering = planner.timed(stats, 'cost', steering_table)(current_ori).tolist()
+    if heuristic == 'field':
+        goal = (int(goal_pos[0]), int(goal_pos[1]))
+        # Named apart from grid.distance_field(), whose unit-cost fields are cached for the same map.
+        field = planner.timed(stats, 'heuristic', grid.map_layer)(
+            ("penalized_distance_field", goal, 8, radius, OBSTACLES_FACTOR), current_map,
+            lambda m: grid.compute_distance_field(m, goal, 8, penalty), version)
+    elif heuristic == 'euclidean':
+        field = None
+    else:
+        raise ValueError("Unknown heuristic: %s" % heuristic)
+    if mode == 'jps':
+        # Jumps only go straight, so the steering cost is charged once per jump point.
+        return planner.timed(stats, 'search', jps.jump_point_search)(
+            current_map, current_pos, goal_pos, penalty, lambda prev, direction: steering[prev][direction],
+            max_jump, field, stats)
+    elif mode not in ('lattice', 'astar', 'anytime', 'bidirectional'):
+        raise ValueError("Unknown search mode: %s" % mode)
+
+    width = current_map.shape[1]
+    start = planner.to_index(current_pos, width)
+    goal = planner.to_index(goal_pos, width)
+
+    if field is None:
+        # The same value as distance(), computed for all cells at once.
+        field = planner.timed(stats, 'heuristic', grid.euclidean_field)(current_map.shape, goal_pos)
+    estimate = planner.timed(stats, 'heuristic', field.ravel().tolist().__getitem__)
+    search = planner.timed(stats, 'search', planner.a_star_search)
+
+    if mode == 'astar':
+        index = planner.timed(stats, 'neighbours', grid.grid_index)(current_map, 8, version)
+        directions = {offset: k for k, offset in enumerate(index.offsets)}
+        penalty = penalty.ravel().tolist()
+
+        def expand(current, prev):
+            turn = steering[directions[int(current - prev)]] if prev >= 0 else steering[-1]
+            for direction, offset, step in index.neighbours(current):
+                candidate = current + offset
+                yield candidate, step * DISTANCE_FACTOR + penalty[candidate] + turn[direction]
+
+        expand = planner.timed(stats, 'neighbours', expand, iterate=True)
+        parent = search(current_map.size, start, goal, expand, estimate, stats)
+        path = planner.reconstruct_path(parent, goal, width)
+        bound = 1.0
+    else:
+        # The steering cost depends on the heading, so the search runs over (x, y, heading) states.
+        states = planner.timed(stats, 'cost', lattice.Lattice)(current_map, steering, penalty, version, DISTANCE_FACTOR)
+        expand = planner.timed(stats, 'neighbours', states.expand(start, goal), iterate=True)
+        if mode == 'anytime':
+            search = planner.timed(stats, 'search', planner.anytime_search)
+            parent, bound = search(states.size, states.start_state, states.goal_state, expand,
+                                   states.heuristic(estimate, start, goal), time_budget, stats=stats)
+        elif mode == 'bidirectional':
+            # The backward search is guided by an estimate of the same kind as the forward one, as averaging
+            # the penalized field with distance() would give away most of it.
+            if heuristic == 'field':
+                reverse_field = planner.timed(stats, 'heuristic', reverse_penalized_field)(current_map, current_pos,
+                                                                                           penalty)
+            else:
+                reverse_field = planner.timed(stats, 'heuristic', grid.euclidean_field)(current_map.shape, current_pos)
+            reverse_estimate = planner.timed(stats, 'heuristic', reverse_field.ravel().tolist().__getitem__)
+            predecessors = planner.timed(stats, 'neighbours', states.predecessors(start, goal), iterate=True)
+            search = planner.timed(stats, 'search', planner.bidirectional_search)
+            parent = search(states.size, states.start_state, states.goal_state, expand, predecessors,
+                            states.heuristic(estimate, start, goal), states.heuristic(reverse_estimate, start, goal), stats)
+            bound = 1.0
+        else:
+            parent = search(states.size, states.start_state, states.goal_state, expand,
+                            states.heuristic(estimate, start, goal), stats)
+            bound = 1.0
+        path = states.reconstruct_path(parent, start)
+    if stats is not None:
+        stats['bound'] = bound
     ###  END CODE HERE  ###
     return path
 
@@ -125,22 +292,69 @@ def reach_goal(current_pos, goal_pos):
 if __name__ == '__main__':
     # Define goal position of the exploration, shown as the gray block in the scene.
     goal_pos = [100, 100]
-    controller = DR20API.Controller()
+    # With --batched, the wheel commands are batched and the pose is read from the streaming buffers.
+    controller = DR20API.Controller(control='batched' if '--batched' in sys.argv else 'blocking')
 
     # Initialize the position of the robot and the map of the world.
     current_pos = controller.get_robot_pos()
     current_map = controller.update_map()
 
+    # With --explore, the unknown scene is mapped first by driving to one frontier after another.
+    if '--explore' in sys.argv:
+        current_pos, current_map = exploration.explore(controller, current_pos, current_map)
+
+    # The cells that changed since the last plan, and the number of plans.
+    path, pending, replans = None, np.zeros(0, dtype=np.int64), 0
+    # The counters of all searches, with phase timings when run with --profile.
+    profile = planner.SearchProfile(phases='--profile' in sys.argv)
+    # With --pipelined, the pose and the scans are streamed by a background thread, so the map and its cost layers
+    # are updated while the robot moves, instead of after it has stopped.
+    pipelined = '--pipelined' in sys.argv
+    if pipelined:
+        controller.start_telemetry()
+
     # Plan-Move-Perceive-Update-Replan loop until the robot reaches the goal.
     while not reach_goal(current_pos, goal_pos):
-        # Plan a path based on current map from current position of the robot to the goal.
-        path = Improved_A_star(current_map, current_pos, goal_pos)
-        # Move the robot along the path to a certain distance.
-        controller.move_robot(path)
+        # The rest of the last path is kept as long as the robot is on it and no new obstacle blocks it.
+        # New obstacles next to the path only raise its penalty and are taken into account by the next plan.
+        tail = None if path is None else planner.remaining_path(path, current_pos)
+        if tail is None or planner.path_blocked(tail, current_map, pending):
+            # Plan a path based on current map from current position of the robot to the goal.
+            # The layers of the map are cached by its version, so only the ones of a changed map are rebuilt.
+            details = profile.stats()
+            path = Improved_A_star(current_map, current_pos, goal_pos, version=controller.map_version,
+                                   current_ori=controller.get_robot_ori(), stats=details)
+            profile.add(details)
+            if profile.phases:
+                print("Search %d: %s" % (profile.calls, details))
+            pending = np.zeros(0, dtype=np.int64)
+            replans += 1
+        else:
+            path = tail
+        # Move the robot along the path to a certain distance, steering only towards the turning points.
+        # Shortcuts in line of sight are not taken, as they would ignore the obstacle penalty.
+        if not pipelined:
+            controller.move_robot(planner.compress_path(path))
+        else:
+            motion = controller.move_robot_async(planner.compress_path(path))
+            while motion.is_alive():
+                motion.join(0.05)
+                current_map = controller.update_map()
+                if controller.map_delta.size:
+                    # The obstacle penalty of the new map is built now, so the next plan finds it in the cache.
+                    pending = np.union1d(pending, controller.map_delta)
+                    obstacle_penalty(current_map, version=controller.map_version)
         # Get current position of the robot.
         current_pos = controller.get_robot_pos()
         # Update the map based on the current information of laser scanner and get the updated map.
+        # The cells that changed are reported in controller.map_delta.
         current_map = controller.update_map()
+        pending = np.union1d(pending, controller.map_delta)
+    print("Planned %d times" % replans)
+    print(profile.report())
+    print("Control: %(ticks)d steps, %(round_trips)d round trips, %(round_trips_per_tick).2f per step"
+          % controller.get_control_stats())
 
     # Stop the simulation.
+    controller.stop_telemetry()
     controller.stop_simulation()
\ No newline at end of file
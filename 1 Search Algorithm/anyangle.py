@@ -0,0 +1,141 @@
+"""
+Any-angle path planning with Theta* and Lazy Theta* on the 8-connected grid.
+
+Unlike A* search, a cell may take the parent of the cell it is reached from as its own parent,
+if the straight line between them is free of obstacles (see grid.line_of_sight). The path is then
+a short list of vertices connected by straight lines instead of a zigzag through neighbouring cells.
+Lazy Theta* assumes the line of sight when a cell is reached and only checks it once the cell is
+expanded, so a single check is needed per expansion instead of one per neighbour.
+"""
+
+import numpy as np
+import heapq
+from math import hypot
+import planner
+import grid
+
+# Lines crossing up to this many columns in total are walked one by one, longer ones are computed at once.
+# Walking costs a couple of microseconds per column, building the arrays of grid.line_cells() about a hundred.
+LINE_WALK = 64
+
+def theta_star(current_map, current_pos, goal_pos, penalty=None, lazy=True, version=None, stats=None):
+    """
+    Plan an any-angle path from the current position to the goal.
+
+    Arguments:
+    current_map -- A H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+    current_pos -- A 2D vector indicating the current position of the robot.
+    goal_pos -- A 2D vector indicating the position of the goal.
+    penalty -- An optional H*W array of additional cost for entering each cell. A straight line pays the
+               penalty of every cell it crosses, and line of sight is then checked eagerly (Theta*).
+    lazy -- Whether to use Lazy Theta*, which is only possible without a penalty.
+    version -- The map version reported by the controller, used to reuse the neighbourhood index.
+    stats -- An optional dict receiving the counters of planner.a_star_search(). If it asks for phase timings
+             (see planner.timed), the heuristic field is timed as 'heuristic'
+             and the line of sight checks as 'neighbours'.
+
+    Return:
+    path -- A N*2 int array of the vertices of the path from the current position to the goal,
+            where consecutive vertices are in line of sight, empty if the goal is unreachable.
+    """
+    current_map = np.asarray(current_map)
+    index = grid.grid_index(current_map, 8, version)
+    width, masks = index.width, index.masks
+    start = planner.to_index(current_pos, width)
+    goal = planner.to_index(goal_pos, width)
+    estimate = planner.timed(stats, 'heuristic', grid.euclidean_field)(current_map.shape, goal_pos).ravel().tolist()
+    lazy = lazy and penalty is None
+    extra = None if penalty is None else np.asarray(penalty, dtype=float).ravel()
+    penalty = [0.0] * index.size if extra is None else extra.tolist()
+    blocked = current_map.ravel() != 0
+    blocked_list = blocked.tolist()
+
+    def line_costs(a, targets):
+        # The costs of the straight lines from a cell to the target cells, inf where a line crosses an obstacle.
+        source = divmod(a, width)
+        columns = sum(max(abs(target // width - source[0]), abs(target % width - source[1])) for target in targets)
+        if columns <= LINE_WALK:
+            walk_penalty = None if extra is None else penalty
+            return [grid.line_cost(blocked_list, width, a, target, walk_penalty) for target in targets]
+        targets = planner.to_path(targets, width)
+        x, y, valid = grid.line_cells(source, targets)
+        cells = x * width + y
+        cost = np.hypot(targets[:, 0] - source[0], targets[:, 1] - source[1])
+        if extra is not None:
+            # Every crossed cell is entered once, except the first one.
+            cost += (extra[cells] * valid).sum(axis=1) - penalty[a]
+        cost[(blocked[cells] & valid).any(axis=1)] = np.inf
+        return cost.tolist()
+
+    line_costs = planner.timed(stats, 'neighbours', line_costs)
+
+    g = np.full(index.size, np.inf)
+    parent = np.full(index.size, -1, dtype=np.int32)
+    closed = np.zeros(index.size, dtype=bool)
+    g_view, parent_view, closed_view = memoryview(g), memoryview(parent), memoryview(closed)
+    push, pop = heapq.heappush, heapq.heappop
+
+    g_view[start] = 0
+    fringe = [(estimate[start], 0, start)]
+    expanded, stale, peak = 0, 0, 1
+    while fringe:
+        if len(fringe) > peak:
+            peak = len(fringe)
+        _, _, current = pop(fringe)
+        if closed_view[current]:
+            stale += 1
+            continue
+        closed_view[current] = True
+
+        anchor = parent_view[current]
+        if lazy and anchor >= 0 and line_costs(anchor, [current])[0] == np.inf:
+            # The assumed line of sight is blocked, so the best expanded neighbour becomes the parent.
+            best, best_g = -1, np.inf
+            for _, offset, step in index.around(current):
+                neighbour = current + offset
+                if closed_view[neighbour] and g_view[neighbour] + step < best_g:
+                    best, best_g = neighbour, g_view[neighbour] + step
+            g_view[current], parent_view[current] = best_g, best
+            anchor = best
+        if current == goal:
+            break
+        expanded += 1
+
+        backward = g_view[current]
+        # Path 1 moves to a neighbour, path 2 goes straight from the parent of the current cell.
+        candidates, tentatives, through = [], [], []
+        if anchor >= 0:
+            anchor_g = g_view[anchor]
+            px, py = divmod(anchor, width)
+        for _, offset, step in index.table[masks[current]]:
+            candidate = current + offset
+            if closed_view[candidate]:
+                continue
+            candidates.append(candidate)
+            tentatives.append(backward + step + penalty[candidate])
+            if anchor >= 0:
+                nx, ny = divmod(candidate, width)
+                through.append(anchor_g + hypot(nx - px, ny - py))
+        if anchor >= 0 and not lazy:
+            # A line pays at least the penalty of the neighbour, so only the lines that can be cheaper are checked,
+            # all of them at once.
+            checked = [k for k, candidate in enumerate(candidates) if through[k] + penalty[candidate] <= tentatives[k]]
+            costs = line_costs(anchor, [candidates[k] for k in checked]) if checked else []
+            through = [np.inf] * len(candidates)
+            for k, line in zip(checked, costs):
+                through[k] = anchor_g + line
+
+        for k, candidate in enumerate(candidates):
+            tentative, source = tentatives[k], current
+            if anchor >= 0 and through[k] <= tentative:
+                tentative, source = through[k], anchor
+            if tentative < g_view[candidate]:
+                g_view[candidate] = tentative
+                parent_view[candidate] = source
+                push(fringe, (tentative + estimate[candidate], -tentative, candidate))
+    else:
+        parent = None
+    if stats is not None:
+        stats.update(expanded=expanded, stale=stale, peak_fringe=peak,
+                     pushes=expanded + stale + (parent is not None) + len(fringe))
+    return planner.reconstruct_path(parent, goal, width)
@@ -0,0 +1,117 @@
+"""
+Batch planning of many (start, goal) queries on one map with a process pool.
+
+The map is copied once into shared memory, and every worker maps it as a NumPy array when it starts,
+so a task only carries the indices of its queries. A worker returns the paths of its queries as one
+concatenated array with their lengths, which keeps the results cheap to send back.
+Like every use of multiprocessing on Windows, plan_batch() must be called under `if __name__ == '__main__':`.
+"""
+
+import numpy as np
+import os
+import time
+import importlib
+from multiprocessing import Pool, shared_memory
+
+# The map and the queries of the worker process, set by attach().
+_worker = {}
+
+def attach(name, shape, dtype, starts, goals, function, options):
+    """
+    Initialize a worker process with the shared map and the queries.
+
+    Arguments:
+    name -- The name of the shared memory block holding the map.
+    shape -- The shape of the map.
+    dtype -- The dtype of the map.
+    starts -- A Q*2 array of start positions.
+    goals -- A Q*2 array of goal positions.
+    function -- The planner, 'A_star' or 'Improved_A_star'.
+    options -- A dict of keyword arguments of the planner.
+    """
+    block = shared_memory.SharedMemory(name=name)
+    _worker['block'] = block
+    _worker['map'] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    _worker['starts'], _worker['goals'] = starts, goals
+    _worker['planner'] = getattr(importlib.import_module(function), function)
+    _worker['options'] = options
+
+def run_queries(queries):
+    """
+    Plan a chunk of queries in a worker process.
+
+    Arguments:
+    queries -- A list of indices of the queries.
+
+    Return:
+    queries -- The indices of the queries.
+    paths -- A M*2 int array of the concatenated paths.
+    lengths -- A list of the number of positions of every path.
+    stats -- A list of dicts of per-query statistics.
+    """
+    plan, current_map, options = _worker['planner'], _worker['map'], _worker['options']
+    paths, lengths, stats = [], [], []
+    for query in queries:
+        details = {}
+        begin = time.perf_counter()
+        path = np.asarray(plan(current_map, _worker['starts'][query], _worker['goals'][query], stats=details, **options),
+                          dtype=np.int64).reshape(-1, 2)
+        details['time'] = time.perf_counter() - begin
+        paths.append(path)
+        lengths.append(len(path))
+        stats.append(details)
+    return queries, np.concatenate(paths) if paths else np.zeros((0, 2), dtype=np.int64), lengths, stats
+
+def plan_batch(current_map, starts, goals, function='A_star', workers=None, chunksize=16, **options):
+    """
+    Plan a path for every (start, goal) query on one map, spread over a pool of processes.
+
+    Arguments:
+    current_map -- A H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+    starts -- A Q*2 array of start positions.
+    goals -- A Q*2 array of goal positions.
+    function -- The planner, 'A_star' or 'Improved_A_star'. Improved_A_star plans from orientation 0
+                unless current_ori is given, as there is no controller to ask in the workers.
+    workers -- The number of processes, all CPUs if None. With 1 process or a single chunk of queries,
+               the queries are planned in this process.
+    chunksize -- The number of queries sent to a worker at once.
+    options -- Keyword arguments passed to the planner, such as mode or heuristic.
+
+    Return:
+    paths -- A list of Q int arrays of positions, empty where the goal is unreachable.
+    stats -- A dict of Q-element arrays of per-query statistics: 'time' in seconds, 'length' in positions,
+             'found', and every value the planner reports in its stats dict, NaN where a query did not report it.
+    """
+    current_map = np.ascontiguousarray(current_map)
+    starts = np.asarray(starts, dtype=np.int64).reshape(-1, 2)
+    goals = np.asarray(goals, dtype=np.int64).reshape(-1, 2)
+    if function == 'Improved_A_star':
+        options.setdefault('current_ori', 0.0)
+    workers = workers or os.cpu_count() or 1
+    chunks = [list(range(first, min(first + chunksize, len(starts)))) for first in range(0, len(starts), chunksize)]
+
+    if workers == 1 or len(chunks) <= 1:
+        _worker.update(map=current_map, starts=starts, goals=goals, options=options,
+                       planner=getattr(importlib.import_module(function), function))
+        results = [run_queries(chunk) for chunk in chunks]
+    else:
+        block = shared_memory.SharedMemory(create=True, size=max(current_map.nbytes, 1))
+        try:
+            np.ndarray(current_map.shape, dtype=current_map.dtype, buffer=block.buf)[...] = current_map
+            with Pool(min(workers, len(chunks)), attach,
+                      (block.name, current_map.shape, current_map.dtype.str, starts, goals, function, options)) as pool:
+                results = pool.map(run_queries, chunks)
+        finally:
+            block.close()
+            block.unlink()
+
+    paths, records = [None] * len(starts), [None] * len(starts)
+    for queries, concatenated, lengths, stats in results:
+        for query, path, record in zip(queries, np.split(concatenated, np.cumsum(lengths)[:-1]), stats):
+            paths[query], records[query] = path, record
+
+    keys = sorted({key for record in records for key in record})
+    summary = {key: np.array([record.get(key, np.nan) for record in records], dtype=float) for key in keys}
+    summary['length'] = np.array([len(path) for path in paths], dtype=np.int64)
+    summary['found'] = summary['length'] > 0
+    return paths, summary
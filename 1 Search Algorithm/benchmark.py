@@ -0,0 +1,257 @@
+"""
+Benchmark of A_star and Improved_A_star on synthetic maps, without the simulator.
+
+Every map is generated from a seed, so the same command line always measures the same maps and queries.
+A planner is given as 'function:mode', and every query records the wall time, the nodes expanded and the
+peak size of the open list reported in the stats dict of the planner, and the length and cost of the path.
+The cost follows the rules of Improved_A_star.cost() for every planner, so the planners can be compared.
+The results are written as JSON, one record per map, query and planner, for example:
+
+    python benchmark.py --maps random maze rooms --sizes 120 500 --output results.json
+"""
+
+import numpy as np
+import argparse
+import importlib
+import json
+import platform
+import sys
+import time
+import types
+import grid
+
+DEFAULT_PLANNERS = ['A_star:astar', 'A_star:bidirectional', 'A_star:theta',
+                    'Improved_A_star:lattice', 'Improved_A_star:jps', 'Improved_A_star:theta']
+
+def random_map(size, seed, density=0.2):
+    """
+    Generate a map of randomly placed obstacles.
+
+    Arguments:
+    size -- The number of rows and columns of the map.
+    seed -- The seed of the random generator.
+    density -- The probability of a cell to be an obstacle.
+
+    Return:
+    current_map -- A size*size array, where 0 indicating traversable and 1 indicating obstacles.
+    """
+    rng = np.random.default_rng(seed)
+    current_map = (rng.random((size, size)) < density).astype(np.uint8)
+    current_map[[0, -1], :] = current_map[:, [0, -1]] = 1
+    return current_map
+
+def maze_map(size, seed, corridor=3):
+    """
+    Generate a perfect maze by a randomized depth-first search, with one path between any two corridors.
+
+    Arguments:
+    size -- The number of rows and columns of the map.
+    seed -- The seed of the random generator.
+    corridor -- The width of the corridors in cells, the walls are one cell thick.
+
+    Return:
+    current_map -- A size*size array, where 0 indicating traversable and 1 indicating obstacles.
+    """
+    rng = np.random.default_rng(seed)
+    pitch = corridor + 1
+    rows = cols = (size - 1) // pitch
+    current_map = np.ones((size, size), dtype=np.uint8)
+    visited = np.zeros((rows, cols), dtype=bool)
+
+    def carve(i, j, di=0, dj=0):
+        # The corridor block of a node, stretched over the wall towards the next node.
+        x, y = 1 + i * pitch, 1 + j * pitch
+        current_map[x + min(di, 0) * pitch:x + corridor + max(di, 0) * pitch,
+                    y + min(dj, 0) * pitch:y + corridor + max(dj, 0) * pitch] = 0
+
+    stack = [(0, 0)]
+    visited[0, 0] = True
+    carve(0, 0)
+    while stack:
+        i, j = stack[-1]
+        moves = [(di, dj) for di, dj in grid.DIRECTIONS[:4].tolist()
+                 if 0 <= i + di < rows and 0 <= j + dj < cols and not visited[i + di, j + dj]]
+        if not moves:
+            stack.pop()
+            continue
+        di, dj = moves[rng.integers(len(moves))]
+        carve(i, j, di, dj)
+        visited[i + di, j + dj] = True
+        stack.append((i + di, j + dj))
+    return current_map
+
+def rooms_map(size, seed, room=20, door=4, clutter=0.05):
+    """
+    Generate rooms on a regular grid, connected by a door in every wall, with some clutter inside.
+
+    Arguments:
+    size -- The number of rows and columns of the map.
+    seed -- The seed of the random generator.
+    room -- The distance between two parallel walls in cells.
+    door -- The width of the doors in cells.
+    clutter -- The probability of a cell inside a room to be an obstacle.
+
+    Return:
+    current_map -- A size*size array, where 0 indicating traversable and 1 indicating obstacles.
+    """
+    rng = np.random.default_rng(seed)
+    current_map = (rng.random((size, size)) < clutter).astype(np.uint8)
+    walls = np.arange(0, size, room)
+    current_map[walls, :] = current_map[:, walls] = 1
+    current_map[-1, :] = current_map[:, -1] = 1
+    for wall in walls[1:]:
+        for first in walls:
+            # A door in the wall segment of every pair of neighbouring rooms, in both orientations.
+            last = min(first + room, size - 1)
+            for axis in (0, 1):
+                offset = first + 1 + rng.integers(max(last - first - door - 1, 1))
+                span = slice(offset, min(offset + door, last))
+                if axis == 0:
+                    current_map[wall, span] = 0
+                else:
+                    current_map[span, wall] = 0
+    current_map[[0, -1], :] = current_map[:, [0, -1]] = 1
+    return current_map
+
+GENERATORS = {'random': random_map, 'maze': maze_map, 'rooms': rooms_map}
+
+def load_planner(function):
+    """
+    Import a planner without the remote API of the simulator.
+    A_star.py and Improved_A_star.py import DR20API for their main loops, which loads the native library of
+    CoppeliaSim, so an empty module stands in for it unless it has been imported already.
+
+    Arguments:
+    function -- The planner, 'A_star' or 'Improved_A_star'.
+
+    Return:
+    plan -- The planning function.
+    """
+    sys.modules.setdefault('DR20API', types.ModuleType('DR20API'))
+    return getattr(importlib.import_module(function), function)
+
+def make_queries(current_map, count, seed):
+    """
+    Pick (start, goal) queries of distant cells that are connected on the 4-connected grid.
+
+    Arguments:
+    current_map -- A H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+    count -- The number of queries.
+    seed -- The seed of the random generator.
+
+    Return:
+    queries -- A list of (start, goal) pairs of positions.
+    """
+    rng = np.random.default_rng(seed)
+    free = np.flatnonzero(current_map.ravel() == 0)
+    width = current_map.shape[1]
+    queries = []
+    while len(queries) < count:
+        goal = divmod(int(rng.choice(free)), width)
+        field = grid.compute_distance_field(current_map, goal, 4).ravel()
+        reachable = free[np.isfinite(field[free])]
+        if len(reachable) < 2:
+            continue
+        # The start is one of the cells in the farther half of the component of the goal.
+        distant = reachable[field[reachable] >= field[reachable].max() / 2]
+        start = divmod(int(rng.choice(distant)), width)
+        queries.append((start, goal))
+    return queries
+
+def path_cost(current_map, path, current_ori=0.0):
+    """
+    Measure a path by the rules of Improved_A_star.cost(), summed over its consecutive positions.
+
+    Arguments:
+    current_map -- A H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+    path -- A N*2 array of positions.
+    current_ori -- The orientation of the robot in radian at the first position.
+
+    Return:
+    distance -- The length of the path.
+    cost -- The length of the path plus the obstacle and steering costs.
+    """
+    path = np.asarray(path, dtype=float).reshape(-1, 2)
+    if len(path) < 2:
+        return 0.0, 0.0
+    moves = np.diff(path, axis=0)
+    lengths = np.linalg.norm(moves, axis=1)
+    headings = np.vstack([[np.sin(current_ori), np.cos(current_ori)], moves[:-1] / lengths[:-1, None]])
+    steering = 1 - np.einsum('ij,ij->i', headings, moves / lengths[:, None])
+    cells = path[1:].astype(np.int64)
+    obstacles = grid.obstacle_count(current_map)[cells[:, 0], cells[:, 1]] / 4
+    return float(lengths.sum()), float((lengths + obstacles + steering).sum())
+
+def run(maps, sizes, planners, queries=3, repeat=3, seed=0):
+    """
+    Run every planner on every query of every map.
+
+    Arguments:
+    maps -- A list of map kinds, keys of GENERATORS.
+    sizes -- A list of map sizes.
+    planners -- A list of planners, given as 'function:mode' or 'function:mode:heuristic'.
+    queries -- The number of queries per map.
+    repeat -- The number of runs of every query, the first one including the map layers built by the planner.
+    seed -- The seed of the first map, every map and its queries use their own seed derived from it.
+
+    Return:
+    records -- A list of dicts, one per map, query and planner.
+    """
+    records = []
+    for kind in maps:
+        for size in sizes:
+            map_seed = seed + size * len(GENERATORS) + sorted(GENERATORS).index(kind)
+            current_map = GENERATORS[kind](size, map_seed)
+            for query, (start, goal) in enumerate(make_queries(current_map, queries, map_seed)):
+                for name in planners:
+                    function, mode, *heuristic = name.split(':')
+                    options = {'mode': mode}
+                    if heuristic:
+                        options['heuristic'] = heuristic[0]
+                    if function == 'Improved_A_star':
+                        options['current_ori'] = 0.0
+                    plan = load_planner(function)
+
+                    times = []
+                    for _ in range(repeat):
+                        # Layers cached on the map content are only built in the first run.
+                        details = {}
+                        begin = time.perf_counter()
+                        path = plan(current_map, list(start), list(goal), stats=details, **options)
+                        times.append(time.perf_counter() - begin)
+                    distance, cost = path_cost(current_map, path)
+                    record = {'map': kind, 'size': size, 'seed': map_seed, 'query': query,
+                              'start': list(start), 'goal': list(goal), 'planner': name,
+                              'found': len(path) > 0, 'time': min(times), 'cold_time': times[0],
+                              'expanded': details.get('expanded'), 'pushes': details.get('pushes'),
+                              'stale': details.get('stale'), 'peak_fringe': details.get('peak_fringe'),
+                              'bound': details.get('bound'), 'positions': len(path),
+                              'distance': distance, 'cost': cost}
+                    records.append(record)
+                    print("%-6s %4d #%d %-28s %8.4fs %8s expanded %8s peak %9.2f cost" %
+                          (kind, size, query, name, record['time'], record['expanded'], record['peak_fringe'], cost),
+                          file=sys.stderr)
+    return records
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark A_star and Improved_A_star on synthetic maps.")
+    parser.add_argument('--maps', nargs='+', default=sorted(GENERATORS), choices=sorted(GENERATORS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[120, 500])
+    parser.add_argument('--planners', nargs='+', default=DEFAULT_PLANNERS,
+                        help="planners as function:mode[:heuristic], e.g. A_star:astar:field")
+    parser.add_argument('--queries', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="the JSON file of the results, printed if not given")
+    args = parser.parse_args()
+
+    report = {
+        'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+        'arguments': vars(args),
+        'results': run(args.maps, args.sizes, args.planners, args.queries, args.repeat, args.seed),
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+    else:
+        print(json.dumps(report, indent=1))
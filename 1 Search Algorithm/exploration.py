@@ -0,0 +1,182 @@
+"""
+Frontier-based exploration of an unknown scene, before goal-directed planning.
+
+The map of the controller marks unseen cells as free, so the cells observed by the laser scanner are kept
+separately in controller.known_map. A frontier cell is an observed free cell next to an unobserved one,
+and the 8-connected groups of frontier cells are the frontiers the robot can drive to.
+The distances to all frontiers come from a single wavefront from the robot, which also gives the path
+to the chosen one, instead of one A* search per frontier.
+"""
+
+import DR20API
+import numpy as np
+import grid
+import planner
+
+def frontier_cells(current_map, known_map):
+    """
+    Find the frontier cells of a map, all cells at once.
+
+    Arguments:
+    current_map -- A H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+    known_map -- A H*W bool array of the cells observed so far.
+
+    Return:
+    frontier -- A H*W bool array of the observed traversable cells with an unobserved 4-connected neighbour.
+    """
+    known_map = np.asarray(known_map, dtype=bool)
+    height, width = known_map.shape
+    # Cells outside the map count as observed, so the border of the map is not a frontier.
+    padded = np.pad(known_map, 1, constant_values=True)
+    unknown_next = np.zeros((height, width), dtype=bool)
+    for dx, dy in grid.DIRECTIONS[:4]:
+        unknown_next |= ~padded[1 + dx:1 + dx + height, 1 + dy:1 + dy + width]
+    return known_map & (np.asarray(current_map) == 0) & unknown_next
+
+def cluster_frontiers(frontier):
+    """
+    Group the frontier cells into 8-connected clusters by propagating the smallest cell id of every cluster.
+
+    Arguments:
+    frontier -- A H*W bool array of frontier cells.
+
+    Return:
+    labels -- A H*W int array of the smallest flattened id of the cluster of every frontier cell, -1 elsewhere.
+    """
+    frontier = np.asarray(frontier, dtype=bool)
+    height, width = frontier.shape
+    cells = np.flatnonzero(frontier)
+    outside = frontier.size
+    labels = np.full(frontier.shape, outside, dtype=np.int64)
+    labels.flat[cells] = cells
+    while True:
+        padded = np.pad(labels, 1, constant_values=outside)
+        smallest = labels.copy()
+        for dx, dy in grid.DIRECTIONS:
+            np.minimum(smallest, padded[1 + dx:1 + dx + height, 1 + dy:1 + dy + width], out=smallest)
+        smallest[~frontier] = outside
+        # Every cell jumps to the label of the cell its label points at, which halves the remaining distance.
+        smallest.flat[cells] = smallest.flat[smallest.flat[cells]]
+        if (smallest == labels).all():
+            break
+        labels = smallest
+    labels[~frontier] = -1
+    return labels
+
+def descend(field, target, connectivity=4):
+    """
+    Follow a distance field from a cell back to its source.
+
+    Arguments:
+    field -- A H*W array of shortest path costs from the source, as returned by grid.compute_distance_field().
+    target -- A 2D vector indicating the position to start from.
+    connectivity -- 4 or 8, the number of directions the field was computed with.
+
+    Return:
+    path -- A N*2 int array of positions from the source to the target.
+    """
+    height, width = field.shape
+    steps = np.hypot(grid.DIRECTIONS[:connectivity, 0], grid.DIRECTIONS[:connectivity, 1])
+    x, y = int(target[0]), int(target[1])
+    ids = [x * width + y]
+    while field[x, y] > 0:
+        best, best_cost = None, field[x, y]
+        for (dx, dy), step in zip(grid.DIRECTIONS[:connectivity].tolist(), steps.tolist()):
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < height and 0 <= ny < width and field[nx, ny] + step <= best_cost:
+                best, best_cost = (nx, ny), field[nx, ny] + step
+        x, y = best
+        ids.append(x * width + y)
+    return planner.to_path(ids[::-1], width)
+
+def next_frontier(current_map, known_map, current_pos, min_size=3, gain=0.0, ignored=None, connectivity=4):
+    """
+    Choose the frontier to explore next and plan the path to it.
+
+    Arguments:
+    current_map -- A H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+    known_map -- A H*W bool array of the cells observed so far.
+    current_pos -- A 2D vector indicating the current position of the robot.
+    min_size -- The minimum number of cells of a frontier, smaller ones are mostly noise of the scanner.
+    gain -- The cost reduction per frontier cell, preferring large frontiers over near ones if positive.
+    ignored -- An optional H*W bool array of frontier cells that are not chosen, such as unreachable ones.
+    connectivity -- 4 or 8, the number of directions the robot can move to.
+
+    Return:
+    target -- The position of the nearest cell of the chosen frontier, None if nothing is left to explore.
+    path -- A N*2 int array of positions from the current position to the target, empty if target is None.
+    """
+    frontier = frontier_cells(current_map, known_map)
+    if ignored is not None:
+        frontier &= ~np.asarray(ignored, dtype=bool)
+    labels = cluster_frontiers(frontier).ravel()
+    cells = np.flatnonzero(labels >= 0)
+    width = current_map.shape[1]
+    if cells.size == 0:
+        return None, planner.to_path([], width)
+
+    # The field from the robot is the distance of the robot to every cell, as the moves are symmetric.
+    field = grid.compute_distance_field(current_map, current_pos, connectivity)
+    # Obstacles receive a distance but cannot be passed, so the path must not descend through them.
+    field[(current_map != 0) & (field > 0)] = np.inf
+    distance = field.ravel()[cells]
+    reachable = np.isfinite(distance)
+    cells, distance, clusters = cells[reachable], distance[reachable], labels[cells[reachable]]
+    # The cells sorted by cluster and distance, so the first cell of every cluster is its nearest one.
+    order = np.lexsort((distance, clusters))
+    cells, distance, clusters = cells[order], distance[order], clusters[order]
+    first = np.flatnonzero(np.r_[True, clusters[1:] != clusters[:-1]]) if cells.size else np.zeros(0, dtype=np.int64)
+    sizes = np.diff(np.r_[first, cells.size])
+    large = sizes >= min_size
+    if not large.any():
+        return None, planner.to_path([], width)
+    first, sizes = first[large], sizes[large]
+    best = first[np.argmin(distance[first] - gain * sizes)]
+    target = planner.to_pos(cells[best], width)
+    return target, descend(field, target, connectivity)
+
+def explore(controller, current_pos, current_map, max_targets=None, min_size=3, gain=0.0):
+    """
+    Drive the robot to one frontier after another until the scene is explored.
+
+    Arguments:
+    controller -- The DR20API.Controller of the robot, whose known_map is updated by update_map().
+    current_pos -- A 2D vector indicating the current position of the robot.
+    current_map -- A H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+    max_targets -- The maximum number of frontiers to drive to, unlimited if None.
+    min_size -- The minimum number of cells of a frontier, see next_frontier().
+    gain -- The cost reduction per frontier cell, see next_frontier().
+
+    Return:
+    current_pos -- The position of the robot after the exploration.
+    current_map -- The map after the exploration.
+    """
+    ignored = np.zeros(current_map.shape, dtype=bool)
+    targets = 0
+    while max_targets is None or targets < max_targets:
+        target, path = next_frontier(current_map, controller.known_map, current_pos, min_size, gain, ignored)
+        if target is None:
+            break
+        if len(path) <= 1:
+            # The robot stands on the frontier and still cannot observe the cells behind it.
+            ignored[target] = True
+            continue
+        controller.move_robot(planner.compress_path(path, current_map))
+        current_pos = controller.get_robot_pos()
+        current_map = controller.update_map()
+        targets += 1
+    print("Explored %.1f%% of the map with %d targets" % (100 * controller.known_map.mean(), targets))
+    return current_pos, current_map
+
+if __name__ == '__main__':
+    controller = DR20API.Controller()
+
+    # Initialize the position of the robot and the map of the world.
+    current_pos = controller.get_robot_pos()
+    current_map = controller.update_map()
+
+    # Explore-Move-Perceive-Update loop until no frontier is left.
+    explore(controller, current_pos, current_map)
+
+    # Stop the simulation.
+    controller.stop_simulation()
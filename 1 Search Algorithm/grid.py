@@ -0,0 +1,439 @@
+"""
+Map-derived lookup structures shared by A_star.py and Improved_A_star.py.
+
+They are computed in one vectorized pass over current_map and cached per map, so the search
+loops only perform table lookups on flattened cell ids (see planner.py).
+"""
+
+import numpy as np
+from math import floor, ceil, hypot, inf
+
+# The first 4 directions are the 4-connected moves, all 8 directions are the 8-connected moves.
+DIRECTIONS = np.array([[-1, 0], [1, 0], [0, -1], [0, 1], [-1, -1], [-1, 1], [1, -1], [1, 1]])
+
+def passability_mask(current_map, connectivity=4):
+    """
+    Compute for every cell a bit mask of the neighbouring cells that can be entered.
+
+    Arguments:
+    current_map -- A H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+    connectivity -- 4 or 8, the number of directions taken from DIRECTIONS.
+
+    Return:
+    mask -- A H*W uint8 array, where bit k is set if the neighbour in DIRECTIONS[k] is inside the map and traversable.
+    """
+    current_map = np.asarray(current_map)
+    height, width = current_map.shape
+    padded = np.pad(current_map != 0, 1, constant_values=True)
+    mask = np.zeros((height, width), dtype=np.uint8)
+    for k, (dx, dy) in enumerate(DIRECTIONS[:connectivity]):
+        free = ~padded[1 + dx:1 + dx + height, 1 + dy:1 + dy + width]
+        mask |= free.astype(np.uint8) << k
+    return mask
+
+class GridIndex:
+    def __init__(self, current_map, connectivity=4):
+        """
+        Build the neighbourhood index of a map.
+
+        Arguments:
+        current_map -- A H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+        connectivity -- 4 or 8, the number of directions taken from DIRECTIONS.
+        """
+        current_map = np.asarray(current_map)
+        self.shape = current_map.shape
+        self.height, self.width = self.shape
+        self.size = current_map.size
+        self.connectivity = connectivity
+        self.directions = DIRECTIONS[:connectivity]
+        self.offsets = [int(dx) * self.width + int(dy) for dx, dy in self.directions]
+        self.steps = [float(np.hypot(dx, dy)) for dx, dy in self.directions]
+        self.mask = passability_mask(current_map, connectivity)
+
+        # The mask is kept as a list of Python integers and every possible mask value is mapped to
+        # its tuple of (direction, offset, step), so an expansion allocates nothing.
+        self.masks = self.mask.ravel().tolist()
+        self.inside = passability_mask(np.zeros(self.shape, dtype=np.uint8), connectivity).ravel().tolist()
+        self.table = [
+            tuple((k, self.offsets[k], self.steps[k]) for k in range(connectivity) if value >> k & 1)
+            for value in range(1 << connectivity)
+        ]
+
+    def neighbours(self, index):
+        """
+        Look up the traversable neighbours of a cell.
+
+        Arguments:
+        index -- The flattened id of the cell.
+
+        Return:
+        neighbours -- A tuple of (direction, offset, step), where index + offset is the flattened id of the neighbour
+                      and step is the length of the move.
+        """
+        return self.table[self.masks[index]]
+
+    def around(self, index):
+        """
+        Look up all neighbours of a cell inside the map, traversable or not.
+
+        Arguments:
+        index -- The flattened id of the cell.
+
+        Return:
+        neighbours -- A tuple of (direction, offset, step) in the same format as neighbours().
+        """
+        return self.table[self.inside[index]]
+
+    def update(self, current_map, cells):
+        """
+        Repair the index after some cells of the map have changed.
+        Only the masks of the changed cells and their neighbours are recomputed.
+
+        Arguments:
+        current_map -- A H*W array indicating the updated map.
+        cells -- An array of flattened ids of the changed cells.
+
+        Return:
+        affected -- An array of flattened ids of the cells whose masks were recomputed.
+        """
+        cells = np.asarray(cells, dtype=np.int64).ravel()
+        if cells.size == 0:
+            return cells
+        occupied = np.asarray(current_map).ravel() != 0
+        x, y = np.divmod(cells, self.width)
+        near_x = (x[:, None] + DIRECTIONS[:, 0]).ravel()
+        near_y = (y[:, None] + DIRECTIONS[:, 1]).ravel()
+        valid = (near_x >= 0) & (near_x < self.height) & (near_y >= 0) & (near_y < self.width)
+        affected = np.unique(np.concatenate([cells, near_x[valid] * self.width + near_y[valid]]))
+
+        x, y = np.divmod(affected, self.width)
+        mask = np.zeros(affected.size, dtype=np.uint8)
+        for k, (dx, dy) in enumerate(self.directions):
+            near_x, near_y = x + dx, y + dy
+            valid = (near_x >= 0) & (near_x < self.height) & (near_y >= 0) & (near_y < self.width)
+            free = np.zeros(affected.size, dtype=bool)
+            free[valid] = ~occupied[near_x[valid] * self.width + near_y[valid]]
+            mask |= free.astype(np.uint8) << k
+        self.mask.ravel()[affected] = mask
+        for index, value in zip(affected.tolist(), mask.tolist()):
+            self.masks[index] = value
+        return affected
+
+_layer_cache = {}
+
+def map_layer(name, current_map, build, version=None):
+    """
+    Get a layer derived from a map, building it only when the map has changed.
+
+    Arguments:
+    name -- A hashable name of the layer, including the parameters it is built with.
+    current_map -- A H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+    build -- A function building the layer from current_map.
+    version -- The map version reported by the controller (see DR20API.Controller.get_map_delta).
+               If not given, the map content is compared with a snapshot instead.
+
+    Return:
+    layer -- The cached or newly built layer.
+    """
+    current_map = np.asarray(current_map)
+    key = (name, id(current_map))
+    cached = _layer_cache.get(key)
+    if cached is not None:
+        stamp, layer = cached
+        if version is not None:
+            if not isinstance(stamp, np.ndarray) and stamp == version:
+                return layer
+        elif isinstance(stamp, np.ndarray) and stamp.shape == current_map.shape and np.array_equal(stamp, current_map):
+            return layer
+
+    if len(_layer_cache) >= 16:
+        _layer_cache.clear()
+    layer = build(current_map)
+    _layer_cache[key] = (version if version is not None else current_map.copy(), layer)
+    return layer
+
+def count_obstacles(current_map):
+    """
+    Count the neighbouring obstacles of every cell, where cells outside the map are counted as obstacles.
+
+    Arguments:
+    current_map -- A H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+
+    Return:
+    count -- A H*W array of the number of obstacles among the 8 neighbours of each cell.
+    """
+    current_map = np.asarray(current_map)
+    height, width = current_map.shape
+    padded = np.pad(current_map != 0, 1, constant_values=True).astype(np.uint8)
+    count = np.zeros((height, width), dtype=np.uint8)
+    for dx, dy in DIRECTIONS:
+        count += padded[1 + dx:1 + dx + height, 1 + dy:1 + dy + width]
+    return count
+
+def distance_to_obstacles(current_map, radius):
+    """
+    Compute the chessboard distance from every cell to the nearest obstacle by repeated dilation,
+    where cells outside the map are counted as obstacles.
+
+    Arguments:
+    current_map -- A H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+    radius -- The largest distance of interest, farther cells get radius + 1.
+
+    Return:
+    distance -- A H*W uint16 array of distances, 0 for obstacles.
+    """
+    current_map = np.asarray(current_map)
+    height, width = current_map.shape
+    front = current_map != 0
+    distance = np.full((height, width), radius + 1, dtype=np.uint16)
+    distance[front] = 0
+    for r in range(1, radius + 1):
+        padded = np.pad(front, 1, constant_values=True)
+        for dx in range(3):
+            for dy in range(3):
+                front = front | padded[dx:dx + height, dy:dy + width]
+        distance[front & (distance > r)] = r
+    return distance
+
+def obstacle_count(current_map, version=None):
+    """
+    Get the number of neighbouring obstacles of every cell, computed once per map version.
+
+    Arguments:
+    current_map -- A H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+    version -- The map version reported by the controller, or None to compare the map content.
+
+    Return:
+    count -- A H*W array of the number of obstacles among the 8 neighbours of each cell.
+    """
+    return map_layer("obstacle_count", current_map, count_obstacles, version)
+
+def obstacle_distance(current_map, radius, version=None):
+    """
+    Get the distance from every cell to the nearest obstacle, computed once per map version.
+
+    Arguments:
+    current_map -- A H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+    radius -- The largest distance of interest, farther cells get radius + 1.
+    version -- The map version reported by the controller, or None to compare the map content.
+
+    Return:
+    distance -- A H*W uint16 array of chessboard distances, 0 for obstacles.
+    """
+    return map_layer(("obstacle_distance", radius), current_map, lambda m: distance_to_obstacles(m, radius), version)
+
+def euclidean_field(shape, goal_pos):
+    """
+    Compute the straight-line distance from every cell to the goal at once.
+
+    Arguments:
+    shape -- The shape (H, W) of the map.
+    goal_pos -- A 2D vector indicating the position of the goal.
+
+    Return:
+    field -- A H*W array of Euclidean distances to the goal.
+    """
+    x, y = np.indices(shape)
+    return np.hypot(x - goal_pos[0], y - goal_pos[1])
+
+def line_cells(a, targets):
+    """
+    Find the cells crossed by the straight lines from the centre of a cell to the centres of other cells at once.
+
+    Every line is cut along its major axis into one interval per column (or row) and the cells spanned
+    by each interval are taken, so at most 2 cells per column. Passing exactly through the corner
+    shared by two diagonal cells only counts the cells on the line, the same as a diagonal move.
+
+    Arguments:
+    a -- A 2D vector indicating the position of the first cell.
+    targets -- A K*2 array of the positions of the other cells.
+
+    Return:
+    x, y -- Two K*M int arrays of the coordinates of the cells crossed by each line.
+    valid -- A K*M bool array, False for the padding of lines shorter than the longest one, whose coordinates are a.
+    """
+    ax, ay = int(a[0]), int(a[1])
+    targets = np.asarray(targets, dtype=np.int64).reshape(-1, 2)
+    dx, dy = targets[:, 0] - ax, targets[:, 1] - ay
+    swap = (np.abs(dy) > np.abs(dx))[:, None]
+    major = np.where(swap[:, 0], dy, dx)[:, None]
+    n = np.abs(major)
+    # Minor axis offsets at both borders of every column, clipped to the end points of the line.
+    column = np.arange(n.max(initial=0) + 1.0)
+    slope = np.where(swap[:, 0], dx, dy)[:, None] / np.maximum(n, 1)
+    low = slope * np.maximum(column - 0.5, 0)
+    high = slope * np.minimum(column + 0.5, n)
+    low, high = np.minimum(low, high), np.maximum(low, high)
+    inside = column <= n
+    first, second = np.floor(low + 0.5), np.ceil(high - 0.5)
+    valid = np.concatenate([inside, inside & (second != first)], axis=1)
+
+    across = np.concatenate([first, second], axis=1).astype(np.int64) * valid
+    along = (np.concatenate([column, column]).astype(np.int64) * np.sign(major)) * valid
+    x = ax + np.where(swap, across, along)
+    y = ay + np.where(swap, along, across)
+    return x, y, valid
+
+def line_cost(blocked, width, a, b, penalty=None):
+    """
+    Walk the cells crossed by a single straight line, the same cells as line_cells(), stopping at the first obstacle.
+    For one line, this is cheaper than building the arrays of line_cells().
+
+    Arguments:
+    blocked -- A list of bool variables of the flattened map, True for obstacles.
+    width -- The number of columns of the map.
+    a -- The flattened id of the first cell.
+    b -- The flattened id of the second cell.
+    penalty -- An optional list of the additional cost for entering each cell of the flattened map,
+               paid for every crossed cell except the first one.
+
+    Return:
+    cost -- The length of the line plus the penalties of the crossed cells, inf if it crosses an obstacle.
+    """
+    ax, ay = divmod(a, width)
+    bx, by = divmod(b, width)
+    dx, dy = bx - ax, by - ay
+    swap = abs(dy) > abs(dx)
+    major, minor = (dy, dx) if swap else (dx, dy)
+    n = abs(major)
+    sign = 1 if major >= 0 else -1
+    slope = minor / max(n, 1)
+    extra = 0.0
+    for column in range(n + 1):
+        low, high = slope * max(column - 0.5, 0), slope * min(column + 0.5, n)
+        if low > high:
+            low, high = high, low
+        first, second = floor(low + 0.5), ceil(high - 0.5)
+        along = column * sign
+        for across in ((first,) if second == first else (first, second)):
+            cell = (ax + across) * width + ay + along if swap else (ax + along) * width + ay + across
+            if blocked[cell]:
+                return inf
+            if penalty is not None:
+                extra += penalty[cell]
+    if penalty is not None:
+        extra -= penalty[a]
+    return hypot(dx, dy) + extra
+
+def line_of_sight(current_map, a, b):
+    """
+    Check whether the straight lines from a cell to other cells are free of obstacles.
+
+    Arguments:
+    current_map -- A H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+    a -- A 2D vector indicating the position of the first cell.
+    b -- A 2D vector indicating the position of the second cell, or a K*2 array of positions.
+
+    Return:
+    visible -- A bool variable, True if no cell crossed by the line is an obstacle,
+               or a K bool array for every line if b is an array of positions.
+    """
+    x, y, valid = line_cells(a, b)
+    visible = ~(np.asarray(current_map)[x, y].astype(bool) & valid).any(axis=1)
+    return bool(visible[0]) if np.ndim(b) == 1 else visible
+
+def compute_distance_field(current_map, goal_pos, connectivity=4, penalty=None):
+    """
+    Compute the cost of the shortest path from every cell to the goal with a vectorized wavefront.
+    Every iteration relaxes the neighbours of the cells improved by the previous one, until nothing improves.
+
+    Arguments:
+    current_map -- A H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+    goal_pos -- A 2D vector indicating the position of the goal.
+    connectivity -- 4 or 8, the number of directions taken from DIRECTIONS.
+    penalty -- An optional H*W array of additional cost for entering each cell.
+
+    Return:
+    field -- A H*W array of shortest path costs to the goal, inf for cells that cannot reach the goal.
+    """
+    current_map = np.asarray(current_map)
+    height, width = current_map.shape
+    free = (current_map == 0).ravel()
+    extra = np.zeros(current_map.size) if penalty is None else np.asarray(penalty, dtype=float).ravel()
+    steps = np.hypot(DIRECTIONS[:connectivity, 0], DIRECTIONS[:connectivity, 1])
+
+    field = np.full(current_map.size, np.inf)
+    front = np.array([int(goal_pos[0]) * width + int(goal_pos[1])])
+    field[front] = 0
+    while front.size > 0:
+        x, y = np.divmod(front, width)
+        # A cell next to the front can move into it, paying the step and the penalty of the front cell.
+        near_x = (x[:, None] + DIRECTIONS[:connectivity, 0]).ravel()
+        near_y = (y[:, None] + DIRECTIONS[:connectivity, 1]).ravel()
+        value = (field[front] + extra[front])[:, None] + steps
+        valid = (near_x >= 0) & (near_x < height) & (near_y >= 0) & (near_y < width)
+        near = near_x[valid] * width + near_y[valid]
+        value = value.ravel()[valid]
+
+        better = value < field[near]
+        near, value = near[better], value[better]
+        np.minimum.at(field, near, value)
+        # Only traversable cells relay the wavefront, obstacles only receive a distance.
+        front = np.unique(near)
+        front = front[free[front]]
+    return field.reshape(height, width)
+
+def distance_field(current_map, goal_pos, connectivity=4, version=None):
+    """
+    Get the goal-rooted distance field of a map, recomputed only when the map has changed.
+    It is the exact cost-to-go of unit-weighted moves, so it can be used as a heuristic for A* search.
+
+    Arguments:
+    current_map -- A H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+    goal_pos -- A 2D vector indicating the position of the goal.
+    connectivity -- 4 or 8, the number of directions taken from DIRECTIONS.
+    version -- The map version reported by the controller, or None to compare the map content.
+
+    Return:
+    field -- A H*W array of shortest path costs to the goal, inf for cells that cannot reach the goal.
+    """
+    goal = (int(goal_pos[0]), int(goal_pos[1]))
+    return map_layer(("distance_field", goal, connectivity), current_map,
+                     lambda m: compute_distance_field(m, goal, connectivity), version)
+
+_zobrist_keys = {}
+
+def compute_hash(current_map):
+    """
+    Compute the Zobrist hash of a map, the XOR of a fixed random 64-bit key of every obstacle.
+
+    Arguments:
+    current_map -- A H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+
+    Return:
+    fingerprint -- A tuple of the shape of the map and its hash.
+    """
+    current_map = np.asarray(current_map)
+    keys = _zobrist_keys.get(current_map.size)
+    if keys is None:
+        keys = _zobrist_keys[current_map.size] = np.random.default_rng(3603).integers(
+            0, np.iinfo(np.int64).max, current_map.size, dtype=np.int64)
+    return current_map.shape, int(np.bitwise_xor.reduce(keys[np.flatnonzero(current_map)]))
+
+def map_hash(current_map, version=None):
+    """
+    Get the fingerprint of a map, recomputed only when the map has changed.
+    Maps with the same obstacles have the same fingerprint, also across controllers and episodes.
+
+    Arguments:
+    current_map -- A H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+    version -- The map version reported by the controller, or None to compare the map content.
+
+    Return:
+    fingerprint -- A tuple of the shape of the map and its hash (see compute_hash()).
+    """
+    return map_layer("hash", current_map, compute_hash, version)
+
+def grid_index(current_map, connectivity=4, version=None):
+    """
+    Get the neighbourhood index of a map, building it only when the map has changed.
+
+    Arguments:
+    current_map -- A H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+    connectivity -- 4 or 8, the number of directions taken from DIRECTIONS.
+    version -- The map version reported by the controller, or None to compare the map content.
+
+    Return:
+    index -- The GridIndex of the map.
+    """
+    return map_layer(("index", connectivity), current_map, lambda m: GridIndex(m, connectivity), version)
@@ -0,0 +1,368 @@
+"""
+Hierarchical path planning (HPA*) on the 4-connected grid of A_star.py, for large maps such as the
+500*500 map of the particle filter controller.
+
+The map is split into square clusters. Every maximal run of traversable cells along the border of two
+clusters is an entrance, crossed by one transition in its middle, or by two at its ends if it is long.
+The cells of the transitions are the nodes of an abstract graph, linked by the transitions and by the
+shortest paths between the nodes of a cluster, all computed with one vectorized wavefront per batch of
+clusters. A query only searches the full grid inside the clusters of the start and the goal, searches
+the abstract graph, and refines its edges inside one cluster at a time. A map update only repairs the
+clusters it touches.
+"""
+
+import numpy as np
+import planner
+
+# Entrances of at least this many cells are crossed by two transitions.
+LONG_ENTRANCE = 6
+
+# The distance of cells not reached by the wavefront inside a cluster.
+UNREACHED = 30000
+
+class HierarchicalPlanner:
+    def __init__(self, current_map, cluster_size=16):
+        """
+        Build the abstract graph of a map.
+
+        Arguments:
+        current_map -- A H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+        cluster_size -- The number of cells of the side of a cluster.
+        """
+        self.current_map = np.array(current_map, dtype=np.uint8)
+        self.height, self.width = self.current_map.shape
+        self.size = self.current_map.size
+        self.cluster_size = cluster_size
+        self.clusters_x = -(-self.height // cluster_size)
+        self.clusters_y = -(-self.width // cluster_size)
+
+        # The transitions (a, b) of the border between a cluster and the next one along the x (0) or y (1) axis.
+        self.transitions = {}
+        # The nodes of every cluster, and the edges of every node to the nodes of its own and neighbouring clusters.
+        self.nodes = {}
+        self.intra = {}
+        self.inter = {}
+        for axis in range(2):
+            for cx in range(self.clusters_x):
+                for cy in range(self.clusters_y):
+                    self.connect((axis, cx, cy))
+        self.refresh([(cx, cy) for cx in range(self.clusters_x) for cy in range(self.clusters_y)])
+
+    def cluster(self, index):
+        """
+        Find the cluster of a cell.
+
+        Arguments:
+        index -- The flattened id of the cell.
+
+        Return:
+        cluster -- A tuple (cx, cy) of the cluster containing the cell.
+        """
+        x, y = divmod(index, self.width)
+        return x // self.cluster_size, y // self.cluster_size
+
+    def free_block(self, cluster):
+        """
+        Get the traversable cells of a cluster, padded to the full size with obstacles at the bottom and right.
+
+        Arguments:
+        cluster -- A tuple (cx, cy) of the cluster.
+
+        Return:
+        block -- A S*S bool array, True where the cell is inside the map and traversable.
+        """
+        size = self.cluster_size
+        x0, y0 = cluster[0] * size, cluster[1] * size
+        block = np.zeros((size, size), dtype=bool)
+        part = self.current_map[x0:x0 + size, y0:y0 + size] == 0
+        block[:part.shape[0], :part.shape[1]] = part
+        return block
+
+    def border(self, key):
+        """
+        Find the transitions across a border between two clusters.
+
+        Arguments:
+        key -- A tuple (axis, cx, cy) of the border between cluster (cx, cy) and the next cluster along the axis.
+
+        Return:
+        transitions -- A list of pairs (a, b) of flattened ids, where a lies in cluster (cx, cy) and b next to it.
+        """
+        axis, cx, cy = key
+        size = self.cluster_size
+        if axis == 0:
+            x = (cx + 1) * size
+            if x >= self.height:
+                return []
+            y0, y1 = cy * size, min((cy + 1) * size, self.width)
+            open_cells = (self.current_map[x - 1, y0:y1] == 0) & (self.current_map[x, y0:y1] == 0)
+            pair = lambda k: ((x - 1) * self.width + y0 + k, x * self.width + y0 + k)
+        else:
+            y = (cy + 1) * size
+            if y >= self.width:
+                return []
+            x0, x1 = cx * size, min((cx + 1) * size, self.height)
+            open_cells = (self.current_map[x0:x1, y - 1] == 0) & (self.current_map[x0:x1, y] == 0)
+            pair = lambda k: ((x0 + k) * self.width + y - 1, (x0 + k) * self.width + y)
+
+        edges = np.flatnonzero(np.diff(np.concatenate([[0], open_cells.astype(np.int8), [0]])))
+        transitions = []
+        for begin, end in zip(edges[::2].tolist(), edges[1::2].tolist()):
+            if end - begin < LONG_ENTRANCE:
+                transitions.append(pair((begin + end - 1) // 2))
+            else:
+                transitions.extend([pair(begin), pair(end - 1)])
+        return transitions
+
+    def connect(self, key):
+        """
+        Replace the transitions of a border and their edges in the abstract graph.
+
+        Arguments:
+        key -- A tuple (axis, cx, cy) of the border, see border().
+        """
+        for a, b in self.transitions.pop(key, []):
+            self.inter[a].discard(b)
+            self.inter[b].discard(a)
+        transitions = self.border(key)
+        if transitions:
+            self.transitions[key] = transitions
+        for a, b in transitions:
+            self.inter.setdefault(a, set()).add(b)
+            self.inter.setdefault(b, set()).add(a)
+
+    def cluster_nodes(self, cluster):
+        """
+        Collect the nodes of a cluster from the transitions of its four borders.
+
+        Arguments:
+        cluster -- A tuple (cx, cy) of the cluster.
+
+        Return:
+        nodes -- A sorted list of flattened ids of the cells of the cluster ending a transition, empty if it has none.
+        """
+        cx, cy = cluster
+        nodes = set()
+        for a, _ in self.transitions.get((0, cx, cy), []) + self.transitions.get((1, cx, cy), []):
+            nodes.add(a)
+        for _, b in self.transitions.get((0, cx - 1, cy), []) + self.transitions.get((1, cx, cy - 1), []):
+            nodes.add(b)
+        return sorted(nodes)
+
+    def distances(self, clusters, sources):
+        """
+        Compute the shortest path lengths inside clusters from source cells, for a batch of clusters at once.
+
+        Arguments:
+        clusters -- A list of clusters (cx, cy).
+        sources -- A list of lists of flattened ids of source cells, one list for every cluster.
+
+        Return:
+        distances -- A list of k*S*S arrays, the number of moves from each of the k sources of a cluster
+                     to every cell of the cluster, moving through traversable cells of the cluster only.
+        """
+        size = self.cluster_size
+        count = max([len(cells) for cells in sources] + [1])
+        free = np.stack([self.free_block(cluster) for cluster in clusters])[:, None]
+        # Distances are small integers, so int16 arrays with a large value for unreached cells keep the wavefront fast.
+        distance = np.full((len(clusters), count, size, size), UNREACHED, dtype=np.int16)
+        # Cells that do not relay the wavefront are lifted to UNREACHED before moving on.
+        stop = np.repeat(np.where(free, 0, UNREACHED).astype(np.int16), count, axis=1)
+        for i, (cluster, cells) in enumerate(zip(clusters, sources)):
+            for j, cell in enumerate(cells):
+                x, y = divmod(cell, self.width)
+                x, y = x - cluster[0] * size, y - cluster[1] * size
+                distance[i, j, x, y] = 0
+                # A source leaves its cell even if it is an obstacle, the same as A* search.
+                stop[i, j, x, y] = 0
+
+        # Every iteration moves from the relaying cells into their 4 neighbours, until nothing improves.
+        front = np.empty_like(distance)
+        near = np.empty_like(distance)
+        while True:
+            np.maximum(distance, stop, out=front)
+            near.fill(UNREACHED)
+            near[:, :, 1:, :] = front[:, :, :-1, :]
+            np.minimum(near[:, :, :-1, :], front[:, :, 1:, :], out=near[:, :, :-1, :])
+            np.minimum(near[:, :, :, 1:], front[:, :, :, :-1], out=near[:, :, :, 1:])
+            np.minimum(near[:, :, :, :-1], front[:, :, :, 1:], out=near[:, :, :, :-1])
+            near += 1
+            if not (near < distance).any():
+                break
+            np.minimum(distance, near, out=distance)
+        distance = np.where(distance >= UNREACHED, np.inf, distance.astype(float))
+        # A cluster without nodes, such as a walled one or the only cluster of a small map, gets a 0*(S*S) array.
+        return [distance[i, :len(cells)].reshape(len(cells), size * size) for i, cells in enumerate(sources)]
+
+    def local(self, cluster, index):
+        """
+        Convert the flattened id of a cell of the map to its flattened id inside its cluster.
+
+        Arguments:
+        cluster -- A tuple (cx, cy) of the cluster containing the cell.
+        index -- The flattened id of the cell in the map.
+
+        Return:
+        local -- The flattened id (x * S + y) of the cell in the S*S block of the cluster.
+        """
+        x, y = divmod(index, self.width)
+        return (x - cluster[0] * self.cluster_size) * self.cluster_size + y - cluster[1] * self.cluster_size
+
+    def refresh(self, clusters, batch=64):
+        """
+        Recompute the nodes and the edges inside a list of clusters.
+
+        Arguments:
+        clusters -- A list of clusters (cx, cy).
+        batch -- The number of clusters sharing one wavefront.
+        """
+        # Clusters with similar numbers of nodes are batched together, so little of the wavefront is padding.
+        nodes = {cluster: self.cluster_nodes(cluster) for cluster in clusters}
+        clusters = sorted(clusters, key=lambda cluster: len(nodes[cluster]))
+        for first in range(0, len(clusters), batch):
+            part = clusters[first:first + batch]
+            cells_of = [nodes[cluster] for cluster in part]
+            for cluster, cells, distance in zip(part, cells_of, self.distances(part, cells_of)):
+                for node in self.nodes.get(cluster, []):
+                    self.intra.pop(node, None)
+                self.nodes[cluster] = cells
+                positions = [self.local(cluster, cell) for cell in cells]
+                for row, node in zip(distance[:, positions].tolist(), cells):
+                    self.intra[node] = [(other, cost) for other, cost in zip(cells, row)
+                                        if other != node and cost < np.inf]
+
+    def update_map(self, current_map, changed):
+        """
+        Repair the abstract graph after some cells of the map have changed.
+
+        Arguments:
+        current_map -- A H*W array indicating the updated map.
+        changed -- An array of flattened ids of the cells whose occupancy has changed.
+
+        Return:
+        repaired -- The number of clusters whose edges were recomputed.
+        """
+        changed = np.asarray(changed, dtype=np.int64).ravel()
+        if changed.size == 0:
+            return 0
+        self.current_map.flat[changed] = np.asarray(current_map).flat[changed]
+        x, y = np.divmod(changed, self.width)
+        touched = set(zip((x // self.cluster_size).tolist(), (y // self.cluster_size).tolist()))
+
+        affected = set(touched)
+        for cx, cy in touched:
+            for axis, bx, by, other in ((0, cx, cy, (cx + 1, cy)), (0, cx - 1, cy, (cx - 1, cy)),
+                                        (1, cx, cy, (cx, cy + 1)), (1, cx, cy - 1, (cx, cy - 1))):
+                if 0 <= other[0] < self.clusters_x and 0 <= other[1] < self.clusters_y:
+                    self.connect((axis, bx, by))
+                    affected.add(other)
+        self.refresh(sorted(affected))
+        return len(affected)
+
+    def plan(self, current_pos, goal_pos, stats=None):
+        """
+        Plan a path from the current position to the goal over the abstract graph.
+
+        Arguments:
+        current_pos -- A 2D vector indicating the current position of the robot.
+        goal_pos -- A 2D vector indicating the position of the goal.
+        stats -- An optional dict receiving 'expanded' nodes of the abstract graph and 'peak_fringe',
+                 as in planner.a_star_search().
+
+        Return:
+        path -- A N*2 int array of positions from the current position to the goal, empty if the goal is unreachable.
+        """
+        start = planner.to_index(current_pos, self.width)
+        goal = planner.to_index(goal_pos, self.width)
+        if self.current_map.flat[goal]:
+            return planner.to_path([], self.width)
+
+        # The start and the goal are linked to the nodes of their clusters by a full resolution search.
+        start_cluster, goal_cluster = self.cluster(start), self.cluster(goal)
+        start_cells = self.nodes[start_cluster] + ([goal] if start_cluster == goal_cluster else [])
+        from_start, to_goal = self.distances([start_cluster, goal_cluster], [[start], [goal]])
+        start_edges = [(cell, cost) for cell, cost in
+                       zip(start_cells, from_start[0, [self.local(start_cluster, cell) for cell in start_cells]].tolist())
+                       if cost < np.inf]
+        goal_edges = {cell: cost for cell, cost in
+                      zip(self.nodes[goal_cluster], to_goal[0, [self.local(goal_cluster, cell)
+                                                                for cell in self.nodes[goal_cluster]]].tolist())
+                      if cost < np.inf}
+        intra, inter = self.intra, self.inter
+
+        def expand(current, prev):
+            if current == start:
+                yield from start_edges
+            if current in goal_edges:
+                yield goal, goal_edges[current]
+            yield from intra.get(current, ())
+            for other in inter.get(current, ()):
+                yield other, 1
+
+        def heuristic(current):
+            x, y = divmod(current, self.width)
+            return abs(x - goal_pos[0]) + abs(y - goal_pos[1])
+
+        parent = planner.a_star_search(self.size, start, goal, expand, heuristic, stats)
+        if parent is None:
+            return planner.to_path([], self.width)
+        return planner.to_path(self.refine(planner.trace(parent, goal)), self.width)
+
+    def refine(self, nodes):
+        """
+        Expand the edges of an abstract path into moves between neighbouring cells.
+
+        Arguments:
+        nodes -- A list of flattened ids of the nodes of the abstract path.
+
+        Return:
+        ids -- A list of flattened ids of every cell of the path.
+        """
+        # Transitions are single moves, every other edge is followed downhill in a wavefront from its end.
+        segments = [(a, b) for a, b in zip(nodes[:-1], nodes[1:]) if self.cluster(a) == self.cluster(b)]
+        clusters = [self.cluster(b) for _, b in segments]
+        fields = dict(zip(segments, self.distances(clusters, [[b] for _, b in segments]))) if segments else {}
+
+        size = self.cluster_size
+        ids = nodes[:1]
+        for a, b in zip(nodes[:-1], nodes[1:]):
+            if (a, b) not in fields:
+                ids.append(b)
+                continue
+            cluster = self.cluster(b)
+            field = fields[(a, b)][0].reshape(size, size)
+            block = self.free_block(cluster)
+            x, y = divmod(self.local(cluster, a), size)
+            while field[x, y] > 0:
+                for dx, dy in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+                    nx, ny = x + dx, y + dy
+                    if 0 <= nx < size and 0 <= ny < size and field[nx, ny] == field[x, y] - 1 and \
+                            (block[nx, ny] or field[nx, ny] == 0):
+                        x, y = nx, ny
+                        break
+                ids.append((cluster[0] * size + x) * self.width + cluster[1] * size + y)
+        return ids
+
+_planners = {}
+
+def hierarchy(current_map, cluster_size=16):
+    """
+    Get the hierarchical planner of a map, repairing it with the cells changed since the last call.
+
+    Arguments:
+    current_map -- A H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+    cluster_size -- The number of cells of the side of a cluster.
+
+    Return:
+    planner -- The HierarchicalPlanner of the map.
+    """
+    current_map = np.asarray(current_map)
+    key = (id(current_map), cluster_size)
+    cached = _planners.get(key)
+    if cached is None or cached.current_map.shape != current_map.shape:
+        if len(_planners) >= 16:
+            _planners.clear()
+        cached = _planners[key] = HierarchicalPlanner(current_map, cluster_size)
+    else:
+        cached.update_map(current_map, np.flatnonzero(current_map.ravel() != cached.current_map.ravel()))
+    return cached
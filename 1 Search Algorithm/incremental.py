@@ -0,0 +1,274 @@
+"""
+Incremental replanning with D* Lite for the Plan-Move-Perceive-Update-Replan loop.
+
+The search runs backwards from the fixed goal, so the g-scores stay valid while the robot moves,
+and a map update only repairs the vertices whose outgoing edges have changed.
+"""
+
+import numpy as np
+import heapq
+import planner
+import grid
+
+SQRT2 = np.sqrt(2)
+
+# Keys closer than this are equal, as sums of diagonal steps and penalties differ in the last bits
+# depending on the order they were added in.
+KEY_TOLERANCE = 1e-9
+
+def key_less(a, b):
+    """
+    Compare two keys of the fringe lexicographically, treating values within KEY_TOLERANCE as equal.
+
+    Arguments:
+    a -- A tuple (k1, k2) of the first key.
+    b -- A tuple (k1, k2) of the second key.
+
+    Return:
+    less -- A bool variable, True if a is smaller than b.
+    """
+    if a[0] < b[0] - KEY_TOLERANCE:
+        return True
+    return a[0] <= b[0] + KEY_TOLERANCE and a[1] < b[1] - KEY_TOLERANCE
+
+class DStarLite:
+    def __init__(self, current_map, goal_pos, connectivity=4, penalty=None):
+        """
+        Initialize the incremental planner for a fixed goal.
+
+        Arguments:
+        current_map -- A H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+        goal_pos -- A 2D vector indicating the position of the goal.
+        connectivity -- 4 or 8, the number of directions the robot can move to.
+        penalty -- An optional H*W array of additional cost for entering each cell.
+        """
+        self.current_map = np.array(current_map, dtype=np.uint8)
+        self.index = grid.GridIndex(self.current_map, connectivity)
+        self.width = self.index.width
+        self.penalty = None if penalty is None else np.array(penalty, dtype=float).ravel()
+        self.goal = planner.to_index(goal_pos, self.width)
+
+        self.g = np.full(self.index.size, np.inf)
+        self.rhs = np.full(self.index.size, np.inf)
+        # The key each cell is queued with, (inf, inf) if it is not in the fringe.
+        self.key = np.full((self.index.size, 2), np.inf)
+        self.fringe = []
+        self.km = 0
+        self.start, self.last = None, None
+        # The counters of the current call of plan(), see planner.a_star_search().
+        self.counters = {'expanded': 0, 'pushes': 0, 'stale': 0, 'peak_fringe': 0}
+
+        self.rhs[self.goal] = 0
+        self.push(self.goal)
+
+    def heuristic(self, a, b):
+        """
+        Calculate a consistent estimate of the cost between two cells.
+
+        Arguments:
+        a -- The flattened id of the first cell.
+        b -- The flattened id of the second cell.
+
+        Return:
+        heuristic -- Manhattan distance for 4-connected and octile distance for 8-connected grids.
+        """
+        ax, ay = divmod(a, self.width)
+        bx, by = divmod(b, self.width)
+        dx, dy = abs(ax - bx), abs(ay - by)
+        if self.index.connectivity == 4:
+            return dx + dy
+        return max(dx, dy) + (SQRT2 - 1) * min(dx, dy)
+
+    def calculate_key(self, s):
+        """
+        Calculate the priority of a cell in the fringe.
+
+        Arguments:
+        s -- The flattened id of the cell.
+
+        Return:
+        key -- A tuple (min(g, rhs) + heuristic from the start + km, min(g, rhs)), compared lexicographically.
+        """
+        best = min(self.g[s], self.rhs[s])
+        return (best + self.heuristic(self.start, s) + self.km, best)
+
+    def push(self, s):
+        """
+        Queue a cell with its current key, replacing the key it was queued with before.
+
+        Arguments:
+        s -- The flattened id of the cell.
+        """
+        key = self.calculate_key(s) if self.start is not None else (self.rhs[s], self.rhs[s])
+        self.key[s] = key
+        heapq.heappush(self.fringe, (key[0], key[1], s))
+        self.counters['pushes'] += 1
+        if len(self.fringe) > self.counters['peak_fringe']:
+            self.counters['peak_fringe'] = len(self.fringe)
+
+    def weight(self, step, v):
+        """
+        Calculate the cost of an edge entering a cell.
+
+        Arguments:
+        step -- The length of the move.
+        v -- The flattened id of the cell entered.
+
+        Return:
+        weight -- The length of the move plus the penalty of the cell, if a penalty is used.
+        """
+        return step if self.penalty is None else step + self.penalty[v]
+
+    def update_vertex(self, u):
+        """
+        Recompute the rhs-value of a cell from its successors, and queue it if it has become inconsistent.
+
+        Arguments:
+        u -- The flattened id of the cell.
+        """
+        if u != self.goal:
+            best = np.inf
+            for _, offset, step in self.index.neighbours(u):
+                v = u + offset
+                best = min(best, self.weight(step, v) + self.g[v])
+            self.rhs[u] = best
+        if self.g[u] != self.rhs[u]:
+            self.push(u)
+        else:
+            self.key[u] = np.inf
+
+    def predecessors(self, u):
+        """
+        Find the cells with an edge entering a cell.
+
+        Arguments:
+        u -- The flattened id of the cell.
+
+        Return:
+        predecessors -- A list of flattened ids, empty if the cell is an obstacle.
+        """
+        if self.current_map.flat[u]:
+            return ()
+        return [u + offset for _, offset, _ in self.index.around(u)]
+
+    def compute_shortest_path(self):
+        """
+        Expand the fringe until the g-value of the start is consistent and no queued key is smaller than its key.
+        """
+        while self.fringe:
+            k1, k2, u = self.fringe[0]
+            if (k1, k2) != tuple(self.key[u]):
+                heapq.heappop(self.fringe)
+                self.counters['stale'] += 1
+                continue
+            if not key_less((k1, k2), self.calculate_key(self.start)) and self.rhs[self.start] == self.g[self.start]:
+                break
+
+            heapq.heappop(self.fringe)
+            self.counters['expanded'] += 1
+            new_key = self.calculate_key(u)
+            if key_less((k1, k2), new_key):
+                self.key[u] = new_key
+                heapq.heappush(self.fringe, (new_key[0], new_key[1], u))
+                self.counters['pushes'] += 1
+            elif self.g[u] > self.rhs[u]:
+                self.g[u] = self.rhs[u]
+                self.key[u] = np.inf
+                for p in self.predecessors(u):
+                    self.update_vertex(p)
+            else:
+                self.g[u] = np.inf
+                self.update_vertex(u)
+                for p in self.predecessors(u):
+                    self.update_vertex(p)
+
+    def update_map(self, current_map, changed, penalty=None):
+        """
+        Repair the search state after the map has changed.
+
+        Arguments:
+        current_map -- A H*W array indicating the updated map.
+        changed -- An array of flattened ids of the cells whose occupancy has changed.
+        penalty -- The updated H*W array of additional cost for entering each cell, if a penalty is used.
+        """
+        changed = np.asarray(changed, dtype=np.int64).ravel()
+        self.current_map.flat[changed] = np.asarray(current_map).flat[changed]
+        self.index.update(self.current_map, changed)
+        if penalty is not None:
+            penalty = np.asarray(penalty, dtype=float).ravel()
+            changed = np.union1d(changed, np.flatnonzero(penalty != self.penalty))
+            self.penalty = penalty.copy()
+        if changed.size == 0:
+            return
+
+        if self.last is not None:
+            self.km += self.heuristic(self.last, self.start)
+            self.last = self.start
+        # The edges entering a changed cell change their costs, so every neighbour of it is repaired.
+        for v in changed.tolist():
+            self.update_vertex(v)
+            for _, offset, _ in self.index.around(v):
+                self.update_vertex(v + offset)
+
+    def plan(self, current_pos, current_map=None, changed=None, penalty=None, stats=None):
+        """
+        Plan a path from the current position to the goal, reusing the previous search.
+
+        Arguments:
+        current_pos -- A 2D vector indicating the current position of the robot.
+        current_map -- The updated H*W map, or None if the map has not changed.
+        changed -- An array of flattened ids of the changed cells, computed from current_map if not given.
+        penalty -- The updated H*W array of additional cost for entering each cell, if a penalty is used.
+        stats -- An optional dict receiving the counters of planner.a_star_search() for this call, where the fringe
+                 is kept between calls. If it asks for phase timings (see planner.timed), the keys are timed as
+                 'heuristic', the rhs-values as 'cost', the predecessors as 'neighbours' and the repair as 'search'.
+
+        Return:
+        path -- A N*2 int array of positions from the current position to the goal, empty if the goal is unreachable
+                or the descent along the g-values does not reach it.
+        """
+        self.counters = dict.fromkeys(self.counters, 0)
+        self.counters['peak_fringe'] = len(self.fringe)
+        timing = stats is not None and stats.get('phases') is not None
+        if timing:
+            # The timed methods shadow the methods of the class until the search state is repaired.
+            self.calculate_key = planner.timed(stats, 'heuristic', self.calculate_key)
+            self.update_vertex = planner.timed(stats, 'cost', self.update_vertex)
+            self.predecessors = planner.timed(stats, 'neighbours', self.predecessors)
+        try:
+            start = planner.to_index(current_pos, self.width)
+            if self.start is None:
+                self.last = start
+            self.start = start
+
+            if current_map is not None:
+                if changed is None:
+                    changed = np.flatnonzero(np.asarray(current_map).ravel() != self.current_map.ravel())
+                self.update_map(current_map, changed, penalty)
+            planner.timed(stats, 'search', self.compute_shortest_path)()
+        finally:
+            if timing:
+                del self.calculate_key, self.update_vertex, self.predecessors
+        if stats is not None:
+            stats.update(self.counters)
+
+        path = []
+        if self.g[start] == np.inf:
+            return planner.to_path(path, self.width)
+        current = start
+        path.append(current)
+        while current != self.goal and len(path) <= self.index.size:
+            best, best_cost = None, np.inf
+            for _, offset, step in self.index.neighbours(current):
+                v = current + offset
+                candidate_cost = self.weight(step, v) + self.g[v]
+                if candidate_cost < best_cost:
+                    best, best_cost = v, candidate_cost
+            if best is None:
+                return planner.to_path([], self.width)
+            current = best
+            path.append(current)
+        # A descent cut off by the length limit has cycled, and a truncated path is not handed out as one.
+        if current != self.goal:
+            return planner.to_path([], self.width)
+        return planner.to_path(path, self.width)
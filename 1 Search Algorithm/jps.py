@@ -0,0 +1,180 @@
+"""
+Jump Point Search on the 8-connected grid, built on the array-backed A* core in planner.py.
+
+Diagonal moves only require the target cell to be traversable, the same as Improved_A_star.
+When a penalty for entering cells is given, the bounded-jump variant is used: jumps stop at every
+cell whose 3*3 neighbourhood contains an obstacle or a penalized cell, and such cells are expanded
+in all directions, so the penalty is charged exactly and symmetry is only pruned in uniform regions.
+"""
+
+import numpy as np
+import planner
+import grid
+
+SQRT2 = np.sqrt(2)
+
+# Index of every direction in grid.DIRECTIONS.
+DIRECTION_INDEX = {(int(dx), int(dy)): k for k, (dx, dy) in enumerate(grid.DIRECTIONS)}
+
+def pruning_rules():
+    """
+    Build the pruning rules of Jump Point Search for every direction.
+
+    Return:
+    natural -- A list of the natural successor directions for each direction.
+    forced -- A list of (blocked, forced) direction pairs for each direction, where the forced direction
+              becomes a successor if the blocked direction is an obstacle.
+    straight -- A list of the two straight components of each diagonal direction, empty for straight directions.
+    """
+    natural, forced, straight = [], [], []
+    for dx, dy in grid.DIRECTIONS.tolist():
+        if dx != 0 and dy != 0:
+            parts = [DIRECTION_INDEX[(dx, 0)], DIRECTION_INDEX[(0, dy)]]
+            natural.append(parts + [DIRECTION_INDEX[(dx, dy)]])
+            forced.append([(DIRECTION_INDEX[(-dx, 0)], DIRECTION_INDEX[(-dx, dy)]),
+                           (DIRECTION_INDEX[(0, -dy)], DIRECTION_INDEX[(dx, -dy)])])
+            straight.append(parts)
+        elif dx != 0:
+            natural.append([DIRECTION_INDEX[(dx, 0)]])
+            forced.append([(DIRECTION_INDEX[(0, 1)], DIRECTION_INDEX[(dx, 1)]),
+                           (DIRECTION_INDEX[(0, -1)], DIRECTION_INDEX[(dx, -1)])])
+            straight.append([])
+        else:
+            natural.append([DIRECTION_INDEX[(0, dy)]])
+            forced.append([(DIRECTION_INDEX[(1, 0)], DIRECTION_INDEX[(1, dy)]),
+                           (DIRECTION_INDEX[(-1, 0)], DIRECTION_INDEX[(-1, dy)])])
+            straight.append([])
+    return natural, forced, straight
+
+NATURAL, FORCED, STRAIGHT = pruning_rules()
+
+def jump_point_search(current_map, current_pos, goal_pos, penalty=None, steering=None, max_jump=None, field=None,
+                      stats=None):
+    """
+    Plan a path on the 8-connected grid with Jump Point Search.
+
+    Arguments:
+    current_map -- A H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+    current_pos -- A 2D vector indicating the current position of the robot.
+    goal_pos -- A 2D vector indicating the position of the goal.
+    penalty -- An optional H*W array of additional cost for entering each cell, enabling the bounded-jump variant.
+    steering -- An optional function (prev_direction, direction) returning the cost of turning between two indices
+                of grid.DIRECTIONS, where prev_direction is -1 at the start position.
+    max_jump -- An optional maximum number of cells of a single jump.
+    field -- An optional H*W goal-rooted distance field used as the heuristic instead of the octile distance.
+    stats -- An optional dict receiving 'expanded' jump points and 'peak_fringe', as in planner.a_star_search().
+
+    Return:
+    path -- A N*2 int array of positions from the current position to the goal, empty if the goal is unreachable.
+    """
+    current_map = np.asarray(current_map)
+    index = grid.grid_index(current_map, 8)
+    width, masks = index.width, index.masks
+    offsets, steps = index.offsets, index.steps
+    start = planner.to_index(current_pos, width)
+    goal = planner.to_index(goal_pos, width)
+    goal_x, goal_y = planner.to_pos(goal, width)
+    max_jump = max_jump or index.size
+
+    if penalty is not None:
+        penalty = np.asarray(penalty, dtype=float)
+        # A cell stops a jump if any cell of its 3*3 neighbourhood is an obstacle or penalized.
+        dirty = np.pad((current_map != 0) | (penalty > 0), 1, constant_values=True)
+        height, map_width = current_map.shape
+        stop = np.zeros(current_map.shape, dtype=bool)
+        for dx in range(3):
+            for dy in range(3):
+                stop |= dirty[dx:dx + height, dy:dy + map_width]
+        stop = stop.ravel().tolist()
+        penalty = penalty.ravel().tolist()
+    else:
+        stop = None
+
+    def forced(cell, direction):
+        mask = masks[cell]
+        return any(not mask >> blocked & 1 and mask >> candidate & 1 for blocked, candidate in FORCED[direction])
+
+    def jump(cell, direction):
+        offset = offsets[direction]
+        for n in range(1, max_jump + 1):
+            if not masks[cell] >> direction & 1:
+                return -1, n
+            cell += offset
+            if cell == goal or n == max_jump:
+                return cell, n
+            if stop is not None:
+                if stop[cell]:
+                    return cell, n
+            elif forced(cell, direction):
+                return cell, n
+            for part in STRAIGHT[direction]:
+                if jump(cell, part)[0] >= 0:
+                    return cell, n
+        return -1, max_jump
+
+    def expand(current, prev):
+        if prev < 0 or (stop is not None and stop[current]):
+            prev_direction = -1 if prev < 0 else direction_between(prev, current, width)
+            directions = range(8)
+        else:
+            prev_direction = direction_between(prev, current, width)
+            directions = NATURAL[prev_direction] + [
+                candidate for blocked, candidate in FORCED[prev_direction]
+                if not masks[current] >> blocked & 1
+            ]
+        for direction in directions:
+            candidate, n = jump(current, direction)
+            if candidate < 0:
+                continue
+            weight = n * steps[direction]
+            if penalty is not None:
+                weight += penalty[candidate]
+            if steering is not None:
+                weight += steering(prev_direction, direction)
+            yield candidate, weight
+
+    if field is not None:
+        heuristic = np.asarray(field).ravel().tolist().__getitem__
+    else:
+        def heuristic(candidate):
+            x, y = divmod(candidate, width)
+            dx, dy = abs(x - goal_x), abs(y - goal_y)
+            return max(dx, dy) + (SQRT2 - 1) * min(dx, dy)
+
+    parent = planner.a_star_search(index.size, start, goal, expand, heuristic, stats)
+    return fill_path(planner.reconstruct_path(parent, goal, width))
+
+def direction_between(a, b, width):
+    """
+    Find the direction of the straight or diagonal line from cell a to cell b.
+
+    Arguments:
+    a -- The flattened id of the first cell.
+    b -- The flattened id of the second cell.
+    width -- The number of columns of the map.
+
+    Return:
+    direction -- The index of the direction in grid.DIRECTIONS.
+    """
+    ax, ay = divmod(int(a), width)
+    bx, by = divmod(int(b), width)
+    return DIRECTION_INDEX[((bx > ax) - (bx < ax), (by > ay) - (by < ay))]
+
+def fill_path(jump_points):
+    """
+    Expand a list of jump points into a path through every cell.
+
+    Arguments:
+    jump_points -- A N*2 array of positions, where consecutive positions lie on a straight or diagonal line.
+
+    Return:
+    path -- A M*2 int array of positions where consecutive positions are neighbouring cells.
+    """
+    jump_points = np.asarray(jump_points, dtype=np.int64).reshape(-1, 2)
+    if len(jump_points) == 0:
+        return jump_points
+    moves = np.diff(jump_points, axis=0)
+    # Every jump is repeated as unit moves, whose running sum gives the cells in between.
+    lengths = np.abs(moves).max(axis=1)
+    units = np.repeat(np.sign(moves), lengths, axis=0)
+    return np.vstack([jump_points[:1], jump_points[0] + np.cumsum(units, axis=0)])
@@ -0,0 +1,175 @@
+"""
+Heading-aware state lattice on the 8-connected grid for Improved_A_star.
+
+A state is a cell together with the direction of the last move, one of the 8 directions in grid.DIRECTIONS.
+The states of a cell are stored next to each other, state = cell * 8 + heading, so the arrays of the search
+have the layout of a H*W*8 array. Two extra states follow them: the start state, whose heading is the initial
+orientation of the robot, and a virtual goal state reached at no cost from every state of the goal cell.
+"""
+
+import numpy as np
+import planner
+import grid
+
+HEADINGS = 8
+
+# Index of the opposite direction of every direction in grid.DIRECTIONS.
+OPPOSITE = [1, 0, 3, 2, 7, 6, 5, 4]
+
+def transition_table(steering, offsets, steps):
+    """
+    Precompute the transitions of every heading for every passability mask of grid.GridIndex.
+
+    Arguments:
+    steering -- A 9*8 array of steering costs, where the last row is for the start state (see Improved_A_star.steering_table).
+    offsets -- The flattened id offsets of the 8 directions.
+    steps -- The weighted lengths of the moves in the 8 directions.
+
+    Return:
+    table -- A list of 9 lists indexed by the passability mask of a cell, holding tuples of (offset, state, cost):
+             the id offset of the next cell, the state offset of the next state relative to cell * 8,
+             and the length and steering cost of turning from the heading into the direction.
+    """
+    steering = np.asarray(steering).tolist()
+    return [
+        [tuple((offsets[d], offsets[d] * HEADINGS + d, steps[d] + row[d]) for d in range(HEADINGS) if value >> d & 1)
+         for value in range(1 << HEADINGS)]
+        for row in steering
+    ]
+
+class Lattice:
+    def __init__(self, current_map, steering, penalty=None, version=None, distance_factor=1):
+        """
+        Build the state lattice of a map.
+
+        Arguments:
+        current_map -- A H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+        steering -- A 9*8 array of steering costs, where the last row is for the first move from the start state.
+        penalty -- An optional H*W array of additional cost for entering each cell.
+        version -- The map version reported by the controller, used to reuse the neighbourhood index.
+        distance_factor -- The weight of the length of a move.
+        """
+        self.index = grid.grid_index(current_map, 8, version)
+        self.width = self.index.width
+        self.size = self.index.size * HEADINGS + 2
+        self.start_state = self.size - 2
+        self.goal_state = self.size - 1
+        self.steering = np.asarray(steering).tolist()
+        self.steps = [step * distance_factor for step in self.index.steps]
+        self.table = transition_table(self.steering, self.index.offsets, self.steps)
+        self.penalty = [0.0] * self.index.size if penalty is None else np.asarray(penalty, dtype=float).ravel().tolist()
+
+    def expand(self, start, goal):
+        """
+        Create the successor function of the lattice for a query.
+
+        Arguments:
+        start -- The flattened id of the start cell.
+        goal -- The flattened id of the goal cell.
+
+        Return:
+        expand -- A function (state, prev) returning (state, weight) pairs, as required by planner.a_star_search().
+        """
+        masks, table, penalty = self.index.masks, self.table, self.penalty
+        start_state, goal_state = self.start_state, self.goal_state
+
+        def expand(state, prev):
+            if state == start_state:
+                cell, heading = start, -1
+                if cell == goal:
+                    yield goal_state, 0.0
+            else:
+                cell, heading = state >> 3, state & 7
+                if cell == goal:
+                    yield goal_state, 0.0
+                    return
+            base = cell * HEADINGS
+            for offset, state_offset, weight in table[heading][masks[cell]]:
+                yield base + state_offset, weight + penalty[cell + offset]
+
+        return expand
+
+    def predecessors(self, start, goal):
+        """
+        Create the predecessor function of the lattice for a query, the reverse of expand().
+
+        Arguments:
+        start -- The flattened id of the start cell.
+        goal -- The flattened id of the goal cell.
+
+        Return:
+        predecessors -- A function (state, next) returning (state, weight) pairs for the states with a transition
+                        into state, as required by planner.bidirectional_search().
+        """
+        masks, inside, offsets, penalty = self.index.masks, self.index.inside, self.index.offsets, self.penalty
+        start_state, goal_state = self.start_state, self.goal_state
+        # The states of a cell entered in a direction, with the length and steering cost of every previous heading.
+        entering = [[(h, self.steps[d] + self.steering[h][d]) for h in range(HEADINGS)] for d in range(HEADINGS)]
+        first = [self.steps[d] + self.steering[-1][d] for d in range(HEADINGS)]
+
+        def predecessors(state, following):
+            if state == goal_state:
+                base = goal * HEADINGS
+                for heading in range(HEADINGS):
+                    yield base + heading, 0.0
+                if start == goal:
+                    yield start_state, 0.0
+                return
+            if state == start_state:
+                return
+            cell, direction = state >> 3, state & 7
+            if not inside[cell] >> OPPOSITE[direction] & 1:
+                return
+            previous = cell - offsets[direction]
+            # The states of the goal cell only lead to the goal state.
+            if previous == goal or not masks[previous] >> direction & 1:
+                return
+            extra = penalty[cell]
+            base = previous * HEADINGS
+            for heading, weight in entering[direction]:
+                yield base + heading, weight + extra
+            if previous == start:
+                yield start_state, first[direction] + extra
+
+        return predecessors
+
+    def heuristic(self, estimate, start, goal):
+        """
+        Lift a heuristic of cells to the states of the lattice.
+
+        Arguments:
+        estimate -- A function returning the estimated cost from a cell id to the goal, or from the start
+                    to a cell id for the backward search of planner.bidirectional_search().
+        start -- The flattened id of the start cell.
+        goal -- The flattened id of the goal cell.
+
+        Return:
+        heuristic -- A function returning the estimated cost of a state.
+        """
+        start_state, goal_state = self.start_state, self.goal_state
+
+        def heuristic(state):
+            if state == goal_state:
+                return estimate(goal)
+            if state == start_state:
+                return estimate(start)
+            return estimate(state >> 3)
+
+        return heuristic
+
+    def reconstruct_path(self, parent, start):
+        """
+        Convert the parent states of the search into a path of cells.
+
+        Arguments:
+        parent -- An array of parent states returned by the search, or None if the goal is unreachable.
+        start -- The flattened id of the start cell.
+
+        Return:
+        path -- A N*2 int array of positions from the start to the goal, empty if the goal is unreachable.
+        """
+        if parent is None:
+            return planner.to_path([], self.width)
+        # The first state is the start state and the last one the virtual goal state.
+        states = planner.trace(parent, self.goal_state)[1:-1]
+        return planner.to_path([start] + [state >> 3 for state in states], self.width)
@@ -0,0 +1,556 @@
+"""
+Array-backed search core shared by A_star.py and Improved_A_star.py.
+
+Cells are addressed by flattened ids (x * width + y). The g-scores, parent ids and closed
+flags of a search live in preallocated NumPy arrays indexed by these ids, and the fringe
+only receives a cell when its g-score strictly improves (lazy deletion of stale entries).
+"""
+
+import numpy as np
+import heapq
+import time
+import grid
+from collections import OrderedDict
+
+def to_index(pos, width):
+    """
+    Convert a 2D position into a flattened cell id.
+
+    Arguments:
+    pos -- A 2D vector indicating a position in the map.
+    width -- The number of columns of the map.
+
+    Return:
+    index -- An integer representing the flattened id of the cell.
+    """
+    return int(pos[0]) * width + int(pos[1])
+
+def to_pos(index, width):
+    """
+    Convert a flattened cell id back into a 2D position.
+
+    Arguments:
+    index -- An integer representing the flattened id of the cell.
+    width -- The number of columns of the map.
+
+    Return:
+    pos -- A tuple indicating the position of the cell in the map.
+    """
+    return divmod(int(index), width)
+
+def a_star_search(size, start, goal, expand, heuristic, stats=None):
+    """
+    Run A* search over flattened cell ids with array-backed open and closed sets.
+
+    Every cell is pushed onto the fringe only when its g-score strictly improves, so it is pushed
+    at most once per incoming edge, and stale entries are dropped when they are popped.
+    Cells with an infinite heuristic are never pushed, as the goal cannot be reached from them.
+
+    Arguments:
+    size -- The number of cells of the map.
+    start -- The flattened id of the start cell.
+    goal -- The flattened id of the goal cell.
+    expand -- A function (current, prev) returning (candidate, weight) pairs for the successors of current,
+              where prev is the parent id of current, -1 for the start cell.
+    heuristic -- A function returning the estimated cost from a cell id to the goal.
+    stats -- An optional dict receiving 'expanded', the number of expanded cells, 'pushes' and 'stale', the number of
+             entries pushed into the fringe and popped with an outdated g-score, and 'peak_fringe', the largest
+             number of entries in the fringe.
+
+    Return:
+    parent -- An array of parent ids of the search tree, or None if the goal is unreachable.
+    """
+    g = np.full(size, np.inf)
+    parent = np.full(size, -1, dtype=np.int32)
+    closed = np.zeros(size, dtype=bool)
+    # Memoryviews give fast scalar access to the arrays in the loop.
+    g_view, parent_view, closed_view = memoryview(g), memoryview(parent), memoryview(closed)
+    push, pop, inf = heapq.heappush, heapq.heappop, np.inf
+
+    g_view[start] = 0
+    # Ties of the priority are broken towards larger g-scores, which matters when the heuristic is exact.
+    fringe = [(heuristic(start), 0, start)]
+    expanded, stale, peak = 0, 0, 1
+    while fringe:
+        # The fringe is largest right after the pushes of an expansion.
+        if len(fringe) > peak:
+            peak = len(fringe)
+        _, _, current = pop(fringe)
+        if closed_view[current]:
+            stale += 1
+            continue
+        closed_view[current] = True
+        if current == goal:
+            break
+        expanded += 1
+
+        backward = g_view[current]
+        for candidate, weight in expand(current, parent_view[current]):
+            tentative = backward + weight
+            if tentative < g_view[candidate] and not closed_view[candidate]:
+                estimate = heuristic(candidate)
+                if estimate == inf:
+                    continue
+                g_view[candidate] = tentative
+                parent_view[candidate] = current
+                push(fringe, (tentative + estimate, -tentative, candidate))
+    else:
+        parent = None
+    if stats is not None:
+        # Every pushed entry has been popped as an expansion, a stale entry or the goal, or is left in the fringe.
+        stats.update(expanded=expanded, stale=stale, peak_fringe=peak,
+                     pushes=expanded + stale + (parent is not None) + len(fringe))
+    return parent
+
+def anytime_search(size, start, goal, expand, heuristic, time_budget, epsilon=3.0, decrease=0.5, stats=None):
+    """
+    Run Anytime Repairing A* (ARA*): find a path quickly with an inflated heuristic,
+    then repeatedly tighten the inflation factor and repair the search while time remains.
+
+    Arguments:
+    size -- The number of cells of the map.
+    start -- The flattened id of the start cell.
+    goal -- The flattened id of the goal cell.
+    expand -- A function (current, prev) returning (candidate, weight) pairs, the same as in a_star_search().
+    heuristic -- A function returning the estimated cost from a cell id to the goal.
+    time_budget -- The wall-clock time in seconds after which the best path found so far is returned.
+                   The first search always runs to completion, so a path is returned whenever one exists.
+    epsilon -- The initial inflation factor of the heuristic.
+    decrease -- The amount the inflation factor is decreased by after every completed search.
+    stats -- An optional dict receiving the counters of a_star_search() over all searches.
+
+    Return:
+    parent -- An array of parent ids of the best path found, or None if the goal is unreachable.
+    bound -- The achieved suboptimality bound, the path cost is at most bound times the optimal cost,
+             inf if the goal is unreachable.
+    """
+    deadline = time.perf_counter() + time_budget
+    g = np.full(size, np.inf)
+    parent = np.full(size, -1, dtype=np.int32)
+    closed = np.zeros(size, dtype=bool)
+    h = {}
+
+    def estimate(s):
+        if s not in h:
+            h[s] = heuristic(s)
+        return h[s]
+
+    g[start] = 0
+    counters = {'expanded': 0, 'pushes': 0, 'stale': 0, 'peak_fringe': 0}
+    # An infinite estimate marks a start the goal cannot be reached from, such as one walled off in the field.
+    if estimate(start) == np.inf:
+        if stats is not None:
+            stats.update(counters)
+        return None, np.inf
+    fringe, incons = [(epsilon * estimate(start), 0, start)], []
+    counters.update(pushes=1, peak_fringe=1)
+
+    def improve_path(first):
+        # Stale entries carry an outdated g-score, or belong to cells closed in this iteration.
+        while fringe:
+            if len(fringe) > counters['peak_fringe']:
+                counters['peak_fringe'] = len(fringe)
+            priority, backward, s = fringe[0]
+            if closed[s] or -backward != g[s]:
+                heapq.heappop(fringe)
+                counters['stale'] += 1
+                continue
+            if g[goal] <= priority and g[goal] < np.inf:
+                return True
+            if not first and time.perf_counter() > deadline:
+                return False
+            heapq.heappop(fringe)
+            closed[s] = True
+            counters['expanded'] += 1
+            for candidate, weight in expand(s, parent[s]):
+                tentative = g[s] + weight
+                if tentative < g[candidate]:
+                    if estimate(candidate) == np.inf:
+                        continue
+                    g[candidate] = tentative
+                    parent[candidate] = s
+                    if closed[candidate]:
+                        incons.append(candidate)
+                    else:
+                        heapq.heappush(fringe, (tentative + epsilon * h[candidate], -tentative, candidate))
+                        counters['pushes'] += 1
+        return g[goal] < np.inf
+
+    best, bound = None, np.inf
+    first = True
+    while True:
+        if not improve_path(first):
+            break
+        # The cheapest unexpanded f-value is a lower bound of the optimal cost.
+        lower = min([g[s] + h[s] for _, backward, s in fringe if -backward == g[s]] +
+                    [g[s] + h[s] for s in incons], default=g[goal])
+        best = parent.copy()
+        bound = min(epsilon, g[goal] / lower) if lower > 0 else 1.0
+        first = False
+        if epsilon <= 1 or time.perf_counter() > deadline:
+            break
+
+        epsilon = max(1.0, epsilon - decrease)
+        cells = {s for _, backward, s in fringe if -backward == g[s]} | set(incons)
+        fringe = [(g[s] + epsilon * h[s], -g[s], s) for s in cells]
+        heapq.heapify(fringe)
+        counters['pushes'] += len(fringe)
+        incons = []
+        closed[:] = False
+    if stats is not None:
+        stats.update(counters)
+    return best, float(max(bound, 1.0))
+
+def bidirectional_search(size, start, goal, expand, predecessors, heuristic, reverse_heuristic, stats=None):
+    """
+    Run bidirectional A* search, growing one search tree from the start and one from the goal.
+
+    Both searches are ordered by the average of the two heuristics, p(v) = (heuristic(v) - reverse_heuristic(v)) / 2
+    for the forward search and -p(v) for the backward search. They then see the same consistent edge costs, so the
+    fringes meet in the middle, and the best path found is optimal once the priorities on top of both fringes add
+    up to at least its cost. The two sides are expanded in turn.
+
+    Averaging halves the guidance of each heuristic, so with the distance fields of A_star.py and Improved_A_star.py,
+    or on the maps of benchmark.py, the two searches together expand about as many cells as unidirectional A*
+    search, and more when the reverse heuristic is weaker than the forward one. With its second heuristic and
+    second fringe, it is slower than unidirectional search here, and is kept to compare against it.
+
+    Arguments:
+    size -- The number of cells of the map.
+    start -- The flattened id of the start cell.
+    goal -- The flattened id of the goal cell.
+    expand -- A function (current, prev) returning (candidate, weight) pairs, the same as in a_star_search().
+    predecessors -- A function (current, next) returning (candidate, weight) pairs for the cells with an edge
+                    into current, where next is the cell current leads to on the way to the goal, -1 for the goal.
+    heuristic -- A consistent function returning the estimated cost from a cell id to the goal.
+    reverse_heuristic -- A consistent function returning the estimated cost from the start to a cell id.
+    stats -- An optional dict receiving the counters of a_star_search() for both sides together.
+
+    Return:
+    parent -- An array of parent ids of the path from the start to the goal, or None if the goal is unreachable.
+    """
+    g = (np.full(size, np.inf), np.full(size, np.inf))
+    link = (np.full(size, -1, dtype=np.int32), np.full(size, -1, dtype=np.int32))
+    closed = (np.zeros(size, dtype=bool), np.zeros(size, dtype=bool))
+    views = [(memoryview(g[k]), memoryview(link[k]), memoryview(closed[k])) for k in range(2)]
+    push, pop, inf = heapq.heappush, heapq.heappop, np.inf
+
+    def forward(s):
+        return (heuristic(s) - reverse_heuristic(s)) / 2
+
+    def backward(s):
+        return (reverse_heuristic(s) - heuristic(s)) / 2
+
+    sides = ((expand, forward), (predecessors, backward))
+    g[0][start], g[1][goal] = 0, 0
+    fringes = ([(forward(start), 0, start)], [(backward(goal), 0, goal)])
+    best, meet = (0, start) if start == goal else (inf, -1)
+    side = 1
+    expanded, stale, peak = 0, 0, 2
+    while True:
+        # Entries of closed cells are stale, the entry on top of a fringe is then the valid one.
+        for k in range(2):
+            fringe, closed_view = fringes[k], views[k][2]
+            while fringe and closed_view[fringe[0][2]]:
+                pop(fringe)
+                stale += 1
+        if not fringes[0] or not fringes[1] or fringes[0][0][0] + fringes[1][0][0] >= best:
+            break
+        if len(fringes[0]) + len(fringes[1]) > peak:
+            peak = len(fringes[0]) + len(fringes[1])
+        expanded += 1
+
+        side = 1 - side
+        g_view, link_view, closed_view = views[side]
+        other_g = views[1 - side][0]
+        neighbours, potential = sides[side]
+        _, _, current = pop(fringes[side])
+        closed_view[current] = True
+
+        distance = g_view[current]
+        for candidate, weight in neighbours(current, link_view[current]):
+            tentative = distance + weight
+            if tentative < g_view[candidate] and not closed_view[candidate]:
+                score = potential(candidate)
+                # A cell neither side can reach has the average nan of two infinite estimates.
+                if not -inf < score < inf:
+                    continue
+                g_view[candidate] = tentative
+                link_view[candidate] = current
+                push(fringes[side], (tentative + score, -tentative, candidate))
+                if tentative + other_g[candidate] < best:
+                    best, meet = tentative + other_g[candidate], candidate
+
+    if stats is not None:
+        stats.update(expanded=expanded, stale=stale, peak_fringe=peak,
+                     pushes=expanded + stale + len(fringes[0]) + len(fringes[1]))
+    if meet < 0:
+        return None
+    # The forward tree leads from the start to the meeting cell, the links of the backward tree are reversed.
+    parent = link[0]
+    current, following = meet, link[1][meet]
+    while following >= 0:
+        parent[following] = current
+        current, following = following, link[1][following]
+    return parent
+
+class PathCache:
+    def __init__(self, capacity=256):
+        """
+        Initialize a bounded cache of planned paths with least recently used eviction.
+
+        Arguments:
+        capacity -- The maximum number of paths kept.
+        """
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def plan(self, key, compute, stats=None):
+        """
+        Look up a path, planning and storing it if it is not cached.
+
+        Arguments:
+        key -- A hashable key of the query, including the map fingerprint (see grid.map_hash), start and goal.
+        compute -- A function (stats) planning the path and filling the stats dict of the search.
+        stats -- An optional dict receiving 'cached', True if the path was cached, and the stats of the search
+                 if it was not. A cached path only reports its 'bound', as no search has run for it.
+
+        Return:
+        path -- The planned path as a read-only N*2 array.
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            if stats is not None:
+                # The counters and timings of the search that planned the path are not replayed.
+                stats['cached'] = True
+                if 'bound' in entry[1]:
+                    stats['bound'] = entry[1]['bound']
+            return entry[0]
+        self.misses += 1
+        details = {'phases': {}} if stats is not None and 'phases' in stats else {}
+        path = np.asarray(compute(details))
+        path.setflags(write=False)
+        self.entries[key] = (path, details)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+        if stats is not None:
+            stats.update(details)
+            stats['cached'] = False
+        return path
+
+def timed(stats, phase, function, iterate=False):
+    """
+    Wrap a function to add its run time to a phase of a search, if the stats dict asks for phase timings.
+    Phase timings are requested by a dict under 'phases' in stats, otherwise the function is returned as it is,
+    so the searches pay nothing for them.
+
+    Arguments:
+    stats -- An optional dict receiving details of the search.
+    phase -- The name of the phase, such as 'heuristic', 'cost', 'neighbours' or 'search'.
+    function -- The function to time.
+    iterate -- Whether the function returns an iterator, which is then consumed into a list inside the timing.
+
+    Return:
+    function -- The timed function.
+    """
+    phases = None if stats is None else stats.get('phases')
+    if phases is None:
+        return function
+    phases.setdefault(phase, 0.0)
+    clock = time.perf_counter
+
+    def wrapper(*args, **kwargs):
+        begin = clock()
+        result = list(function(*args, **kwargs)) if iterate else function(*args, **kwargs)
+        phases[phase] += clock() - begin
+        return result
+
+    return wrapper
+
+class SearchProfile:
+    def __init__(self, phases=False):
+        """
+        Initialize the aggregated stats of the searches of a Plan-Move-Perceive-Update-Replan loop.
+
+        Arguments:
+        phases -- Whether the searches also time their phases (see timed()), which slows them down.
+        """
+        self.phases = phases
+        self.calls = 0
+        self.totals = {}
+        self.peaks = {}
+        self.times = {}
+
+    def stats(self):
+        """
+        Create the stats dict of a search call.
+
+        Return:
+        stats -- An empty dict, holding an empty 'phases' dict if the phases are timed.
+        """
+        return {'phases': {}} if self.phases else {}
+
+    def add(self, stats):
+        """
+        Add the stats of a search call, as filled by the planner.
+
+        Arguments:
+        stats -- A dict returned by stats() after the call.
+        """
+        self.calls += 1
+        for key, value in stats.items():
+            if key == 'phases':
+                for phase, seconds in value.items():
+                    self.times[phase] = self.times.get(phase, 0.0) + seconds
+            elif key.startswith('peak') or key == 'bound':
+                self.peaks[key] = max(self.peaks.get(key, value), value)
+            elif isinstance(value, (int, float)):
+                self.totals[key] = self.totals.get(key, 0) + value
+
+    def report(self):
+        """
+        Summarize the searches, with totals and averages per call of the counters and the phase timings.
+
+        Return:
+        report -- A multi-line string.
+        """
+        calls = max(self.calls, 1)
+        lines = ["%d searches" % self.calls]
+        lines += ["%-12s %12d total %12.1f per search" % (key, value, value / calls)
+                  for key, value in sorted(self.totals.items())]
+        lines += ["%-12s %12g max" % (key, value) for key, value in sorted(self.peaks.items())]
+        lines += ["%-12s %12.4f s total %10.4f s per search" % (phase, seconds, seconds / calls)
+                  for phase, seconds in sorted(self.times.items())]
+        return "\n".join(lines)
+
+def to_path(ids, width):
+    """
+    Convert a sequence of flattened cell ids into positions.
+
+    Arguments:
+    ids -- A sequence of flattened cell ids.
+    width -- The number of columns of the map.
+
+    Return:
+    path -- A N*2 int array of positions.
+    """
+    x, y = np.divmod(np.asarray(ids, dtype=np.int64).reshape(-1), width)
+    return np.stack([x, y], axis=1)
+
+def trace(parent, goal):
+    """
+    Follow the parent ids from the goal back to the start.
+
+    Arguments:
+    parent -- An array of parent ids returned by the search.
+    goal -- The flattened id of the goal cell.
+
+    Return:
+    ids -- A list of flattened ids from the start to the goal.
+    """
+    parent_view = memoryview(parent)
+    ids = []
+    current = goal
+    while current >= 0:
+        ids.append(current)
+        current = parent_view[current]
+    ids.reverse()
+    return ids
+
+def reconstruct_path(parent, goal, width):
+    """
+    Convert the search tree into the path from the start to the goal in linear time.
+
+    Arguments:
+    parent -- An array of parent ids returned by the search, or None if the goal is unreachable.
+    goal -- The flattened id of the goal cell.
+    width -- The number of columns of the map.
+
+    Return:
+    path -- A N*2 int array of positions from the start to the goal, empty if the goal is unreachable.
+    """
+    if parent is None:
+        return to_path([], width)
+    return to_path(trace(parent, goal), width)
+
+def remaining_path(path, current_pos):
+    """
+    Cut off the part of a path the robot has already travelled.
+
+    Arguments:
+    path -- A N*2 array of positions of the last planned path.
+    current_pos -- A 2D vector indicating the current position of the robot.
+
+    Return:
+    tail -- A M*2 int array of positions from the current position to the end of the path,
+            or None if the robot is not on or next to the path.
+    """
+    path = np.asarray(path, dtype=np.int64).reshape(-1, 2)
+    if len(path) == 0:
+        return None
+    current_pos = np.asarray(current_pos, dtype=np.int64)
+    gap = np.abs(path - current_pos).max(axis=1)
+    # The furthest of the nearest cells, so the robot never steers back along the path.
+    nearest = int(np.flatnonzero(gap == gap.min())[-1])
+    if gap[nearest] > 1:
+        return None
+    if gap[nearest] == 1:
+        return np.vstack([current_pos[None], path[nearest:]])
+    return path[nearest:]
+
+def path_blocked(path, current_map, delta=None):
+    """
+    Check whether a path crosses an obstacle, skipping its first cell where the robot stands.
+
+    Arguments:
+    path -- A N*2 array of positions.
+    current_map -- A H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+    delta -- An optional array of flattened ids of the cells that changed since the path was checked last
+             (see DR20API.Controller.map_delta), occupied or free. Only the cells of the path among them are
+             then looked up in current_map, so a freed cell does not block the path.
+
+    Return:
+    blocked -- A bool variable, True if any cell of the path after the first is an obstacle.
+    """
+    cells = np.asarray(path, dtype=np.int64).reshape(-1, 2)[1:]
+    current_map = np.asarray(current_map)
+    if delta is not None:
+        cells = cells[np.isin(cells[:, 0] * current_map.shape[1] + cells[:, 1], delta)]
+    return bool(current_map[cells[:, 0], cells[:, 1]].any())
+
+def compress_path(path, current_map=None):
+    """
+    Reduce a path to the waypoints the robot has to steer towards.
+
+    Collinear runs of cells are collapsed into their end points. If a map is given, waypoints are also
+    skipped as long as the straight line from the last kept waypoint is free of obstacles (see grid.line_of_sight).
+
+    Arguments:
+    path -- A N*2 array of positions, where consecutive positions are neighbouring cells.
+    current_map -- An optional H*W array indicating current map, where 0 indicating traversable and 1 indicating obstacles.
+
+    Return:
+    waypoints -- A M*2 int array of positions, including the first and the last position of the path.
+    """
+    path = np.asarray(path, dtype=np.int64).reshape(-1, 2)
+    if len(path) <= 2:
+        return path
+    moves = np.diff(path, axis=0)
+    # A position is kept where the direction of the move changes.
+    turns = np.any(moves[1:] != moves[:-1], axis=1)
+    waypoints = path[np.concatenate([[True], turns, [True]])]
+    if current_map is None or len(waypoints) <= 2:
+        return waypoints
+
+    kept = [0]
+    anchor = 0
+    for k in range(2, len(waypoints)):
+        if not grid.line_of_sight(current_map, waypoints[anchor], waypoints[k]):
+            anchor = k - 1
+            kept.append(anchor)
+    kept.append(len(waypoints) - 1)
+    return waypoints[kept]
@@ -15,6 +15,10 @@ class Controller:
         """
         self.map_size = 500
         self.current_map = np.zeros((self.map_size,self.map_size),dtype="uint8")
+        # The version increases whenever update_map changes the map, and map_delta holds the flattened ids
+        # (x * map_size + y) of the cells that became occupied in the last update.
+        self.map_version = 0
+        self.map_delta = np.zeros(0, dtype=np.int64)
         self.port = port
         self.client = self.connect_simulation(self.port)
         # Get handles
@@ -94,6 +98,7 @@ class Controller:
     def update_map(self):
         """
         Update the map based on the current information of laser scanner. The obstacles are inflated to avoid collision.
+        The newly occupied cells and the map version are recorded, see get_map_delta().
 
         Return:
         current_map --  where 0 indicating traversable and 1 indicating obstacles.
@@ -109,6 +114,7 @@ class Controller:
         print('ori:')
         print(orientation)
         data = self.get_lidar()
+        delta = []
         for i in range(1,pts+1):
             absolute_angle = AtoR * (-scanningAngle / 2 + i * scanningAngle / pts) + orientation[2]
             lidar_pose_x = pos[0]
@@ -120,10 +126,29 @@ class Controller:
                 pixel_y = scale *  1 * obstacle_x + 2.5 * scale
                 pixel_x=int(pixel_x)
                 pixel_y=int(pixel_y)
-                self.current_map[min(pixel_x,self.map_size-1)][min(pixel_y,self.map_size-1)] = 1
+                # Hits beyond the edges are clamped on both sides, so a negative index does not wrap around
+                # and the recorded id is the cell that is marked.
+                pixel_x = min(max(pixel_x,0),self.map_size-1)
+                pixel_y = min(max(pixel_y,0),self.map_size-1)
+                if self.current_map[pixel_x][pixel_y] == 0:
+                    self.current_map[pixel_x][pixel_y] = 1
+                    delta.append(pixel_x * self.map_size + pixel_y)
+        self.map_delta = np.array(delta, dtype=np.int64)
+        if len(delta) > 0:
+            self.map_version += 1
         time.sleep(0.1)
         return self.current_map
 
+    def get_map_delta(self):
+        """
+        Get the change of the map made by the last call of update_map.
+
+        Return:
+        map_version -- An integer increased by one every time update_map changes the map.
+        map_delta -- An array of flattened ids (x * map_size + y) of the cells that became occupied in the last update.
+        """
+        return self.map_version, self.map_delta
+
     def move_robot_vw(self,v,w):
         """
         Given linear velocity and angular velocity, 